@@ -1,4 +1,10 @@
+import asyncio
+import bisect
+import copy
 import inspect
+import time
+from collections import OrderedDict
+from itertools import repeat
 
 try:
     __js_write
@@ -101,8 +107,8 @@ class InvalidSyntaxError(Error):
         super().__init__(pos_start, pos_end, 'Invalid Syntax', details)
 
 class RTError(Error):
-    def __init__(self, pos_start, pos_end, details, context):
-        super().__init__(pos_start, pos_end, 'RunTime error', details)
+    def __init__(self, pos_start, pos_end, details, context, error_name='RunTime error'):
+        super().__init__(pos_start, pos_end, error_name, details)
         self.context = context
 
     def as_string(self):
@@ -112,16 +118,51 @@ class RTError(Error):
         return result
 
     def generate_traceback(self):
-        result = ''
+        lines = []
         pos = self.pos_start
         ctx = self.context
 
         while ctx:
-            result = f'   File {pos.fn}, line {str(pos.ln + 1)}, in {ctx.display_name}\n' + result
+            lines.append(f'   File {pos.fn}, line {str(pos.ln + 1)}, in {ctx.display_name}\n')
             pos = ctx.parent_entry_pos if ctx.parent_entry_pos else pos
             ctx = ctx.parent
 
-        return 'Traceback (most recent call last):\n' + result
+        # Deep recursion repeats the same line; like Python, show it three times only
+        result = []
+        previous, repeats = None, 0
+        for line in lines[::-1] + [None]:
+            if line == previous:
+                repeats += 1
+                if repeats < 3:
+                    result.append(line)
+                continue
+            if repeats >= 3:
+                result.append(f'   [Previous line repeated {repeats - 2} more times]\n')
+            previous, repeats = line, 0
+            if line is not None:
+                result.append(line)
+
+        return 'Traceback (most recent call last):\n' + ''.join(result)
+
+class StepLimitError(RTError):
+    def __init__(self, pos_start, pos_end, details, context):
+        super().__init__(pos_start, pos_end, details, context, 'Step Limit Exceeded')
+
+class TimeLimitError(RTError):
+    def __init__(self, pos_start, pos_end, details, context):
+        super().__init__(pos_start, pos_end, details, context, 'Time Limit Exceeded')
+
+class MemoryLimitError(RTError):
+    def __init__(self, pos_start, pos_end, details, context):
+        super().__init__(pos_start, pos_end, details, context, 'Memory Limit Exceeded')
+
+class OutputLimitError(RTError):
+    def __init__(self, pos_start, pos_end, details, context):
+        super().__init__(pos_start, pos_end, details, context, 'Output Limit Exceeded')
+
+class RecursionLimitError(RTError):
+    def __init__(self, pos_start, pos_end, details, context):
+        super().__init__(pos_start, pos_end, details, context, 'Recursion Limit Exceeded')
 
 class IndentationError(Error):
     def __init__(self, pos_start, pos_end, indent=0, exp_indent=0, details=""):
@@ -202,6 +243,7 @@ KEYWORDS = [
     'for',
     'to',
     'downto',
+    'in',
     'while',
     'function',
     'do',
@@ -303,7 +345,7 @@ class Lexer:
                 if error: return [], error
                 tokens.append(token)
             elif self.current_char == '<':
-                if len(self.text[self.pos.idx:]) >= 3 and self.text[self.pos.idx:self.pos.idx+3] == '<--':
+                if self.text.startswith('<--', self.pos.idx):
                     tokens.append(Token(TT_EQ, pos_start=self.pos))
                     for _ in range(3):
                         self.advance()
@@ -543,8 +585,19 @@ class WhileNode(Node):
     def __repr__(self):
         return f"While({self.condition_node}) DO ({self.body_node})"
 
+class ForEachNode(Node):
+    def __init__(self, var_name_tok, iterable_node, body_node, should_return_null):
+        super().__init__(var_name_tok.pos_start, body_node.pos_end)
+        self.var_name_tok = var_name_tok
+        self.iterable_node = iterable_node
+        self.body_node = body_node
+        self.should_return_null = should_return_null
+
+    def __repr__(self):
+        return f"ForEach({self.var_name_tok.value} in {self.iterable_node}) DO ({self.body_node})"
+
 class FunctionDefNode(Node):
-    def __init__(self, var_name_tok, arg_name_toks, body_node, return_type):
+    def __init__(self, var_name_tok, arg_name_toks, body_node, return_type, local_types=None):
         if var_name_tok:
             pos_start = var_name_tok.pos_start
         elif len(arg_name_toks) > 0:
@@ -560,6 +613,8 @@ class FunctionDefNode(Node):
         self.arg_name_toks = arg_name_toks
         self.body_node = body_node
         self.return_type = return_type
+        self.local_types = local_types or {}
+        self.pure = False
 
 class CallNode(Node):
     def __init__(self, node_to_call, arg_nodes):
@@ -576,6 +631,7 @@ class CallNode(Node):
 
         self.node_to_call = node_to_call
         self.arg_nodes = arg_nodes
+        self.call_cache = None
 
     def __repr__(self):
         args_repr = ", ".join(repr(arg) for arg in self.arg_nodes)
@@ -586,6 +642,14 @@ class ReturnNode(Node):
         super().__init__(pos_start, pos_end)
         self.node_to_return = node_to_return
 
+class TailCallNode(Node):
+    def __init__(self, return_node):
+        super().__init__(return_node.pos_start, return_node.pos_end)
+        self.return_node = return_node
+
+    def __repr__(self):
+        return f"TailCall({self.return_node.node_to_return})"
+
 class IndexAssignNode(Node):
     def __init__(self, target_node, value_node):
         super().__init__(target_node.pos_start, value_node.pos_end)
@@ -604,6 +668,44 @@ class IndexAccessNode(Node):
     def __repr__(self):
         return f"IndexAccess({self.target_node}, {self.index_nodes})"
 
+class StatementProbe(Node):
+    def __init__(self, node, index):
+        super().__init__(node.pos_start, node.pos_end)
+        self.node = node
+        self.index = index
+
+    def __repr__(self):
+        return f"Probe({self.index}, {self.node})"
+
+class LoopScopeNode(Node):
+    def __init__(self, loop_node, slots):
+        super().__init__(loop_node.pos_start, loop_node.pos_end)
+        self.loop_node = loop_node
+        self.slots = slots
+
+    def __repr__(self):
+        return f"LoopScope({self.slots}, {self.loop_node})"
+
+class HoistedNode(Node):
+    def __init__(self, node, slot):
+        super().__init__(node.pos_start, node.pos_end)
+        self.node = node
+        self.slot = slot
+
+    def __repr__(self):
+        return f"Hoisted({self.slot}, {self.node})"
+
+class InductionNode(Node):
+    def __init__(self, var_name, factor_node, original_node, slot):
+        super().__init__(original_node.pos_start, original_node.pos_end)
+        self.var_name = var_name
+        self.factor_node = factor_node
+        self.original_node = original_node
+        self.slot = slot
+
+    def __repr__(self):
+        return f"Induction({self.slot}, {self.var_name} * {self.factor_node})"
+
 
 ######################################
 # PARSE RESULT
@@ -652,14 +754,24 @@ class ParseResult:
 ######################################
 
 class Parser:
-    def __init__(self, tokens):
+    def __init__(self, tokens, symbol_table):
         self.tokens = tokens
+        self.symbol_table = symbol_table
         self.tok_idx = -1
         self.indent_lvl = 0
         self.exp_indent_lvl = 0
         self.bns_indent_level = 0
         self.advance()
 
+        # A user function may take the name of a library builtin such as 'max'
+        for tok, name_tok in zip(tokens, tokens[1:]):
+            if tok.matches(TT_KEYWORD, 'function') and name_tok.type == TT_IDENTIFIER and self.library_builtin(name_tok.value):
+                self.symbol_table.set(name_tok.value, None)
+
+    def library_builtin(self, name):
+        value = self.symbol_table.get(name)
+        return isinstance(value, BuiltInFunction) and value.name in BuiltInFunction.LIBRARY
+
     def advance(self, ):
         self.tok_idx += 1
         if self.tok_idx < len(self.tokens):
@@ -717,7 +829,11 @@ class Parser:
             self.advance()
         elif self.current_tok.type == TT_KEYWORD and self.current_tok.value == 'function':
             self.exp_indent_lvl += 1
+            # Parameters and locals are declared in the function's own scope
+            scope = self.symbol_table
+            self.symbol_table = SymbolTable(scope)
             func_def = res.register(self.func_def())
+            self.symbol_table = scope
             if res.error: return res
             return res.success(func_def)
         else:
@@ -814,18 +930,39 @@ class Parser:
             res.register_advancement()
             self.advance()
             var_type = f"array<{var_type}>"
+        elif self.current_tok.matches(TT_IDENTIFIER, 'map'):
+            res.register_advancement()
+            self.advance()
+            if not self.current_tok.matches(TT_IDENTIFIER, 'of'):
+                return res.failure(InvalidSyntaxError(self.current_tok.pos_start, self.current_tok.pos_end, "Expected 'of' after 'map'")), None
+            res.register_advancement()
+            self.advance()
+            if self.current_tok.type != TT_IDENTIFIER or self.current_tok.value not in ["int", "float", "str", "bool"]:
+                return res.failure(InvalidSyntaxError(self.current_tok.pos_start, self.current_tok.pos_end, "Expected a valid key type (int, float, str ou bool) after 'of'")), None
+            key_type = self.current_tok.value
+            res.register_advancement()
+            self.advance()
+            if not self.current_tok.matches(TT_KEYWORD, 'to'):
+                return res.failure(InvalidSyntaxError(self.current_tok.pos_start, self.current_tok.pos_end, "Expected 'to' after the key type")), None
+            res.register_advancement()
+            self.advance()
+            if self.current_tok.type != TT_IDENTIFIER or self.current_tok.value not in ["int", "float", "str", "bool"]:
+                return res.failure(InvalidSyntaxError(self.current_tok.pos_start, self.current_tok.pos_end, "Expected a valid value type (int, float, str ou bool) after 'to'")), None
+            var_type = f"map<{key_type},{self.current_tok.value}>"
+            res.register_advancement()
+            self.advance()
         else:
             if self.current_tok.type != TT_IDENTIFIER or self.current_tok.value not in ["int", "float", "str", "bool"]:
-                return res.failure(InvalidSyntaxError(self.current_tok.pos_start, self.current_tok.pos_end, "Expected 'int', 'float', 'str' 'bool' or 'array'")), None
+                return res.failure(InvalidSyntaxError(self.current_tok.pos_start, self.current_tok.pos_end, "Expected 'int', 'float', 'str' 'bool', 'array' or 'map'")), None
             var_type = self.current_tok.value
             res.register_advancement()
             self.advance()
 
         for var_name in var_names:
-            if global_symbol_table.get(var_name.value):
+            if self.symbol_table.get(var_name.value) and not self.library_builtin(var_name.value):
                 return res.failure(InvalidSyntaxError(var_name.pos_start, var_name.pos_end, f"Variable '{var_name.value}' is already declared")), None
 
-            global_symbol_table.set(var_name.value, None, var_type)
+            self.symbol_table.set(var_name.value, None, var_type)
 
         return res.success(None), var_names[0]
 
@@ -934,7 +1071,7 @@ class Parser:
             if res.error: return res
             return res.success(UnaryOpNode(op_tok, node))
 
-        node = res.register(self.bin_op(self.arith_expr, (TT_EE, TT_NE, TT_LT, TT_GT, TT_LTE, TT_GTE)))
+        node = res.register(self.bin_op(self.arith_expr, (TT_EE, TT_NE, TT_LT, TT_GT, TT_LTE, TT_GTE, (TT_KEYWORD, 'in'))))
 
         if res.error:
             return res.failure(InvalidSyntaxError(self.current_tok.pos_start, self.current_tok.pos_end, "Expected int, float, '+', '-', '(' or 'not'"))
@@ -967,21 +1104,23 @@ class Parser:
         atom = res.register(self.atom())
         if res.error: return res
 
-        if isinstance(atom, VarAccessNode) and isinstance(global_symbol_table.get(atom.var_name_tok.value), BuiltInFunction):
-            func = global_symbol_table.get(atom.var_name_tok.value)
+        if isinstance(atom, VarAccessNode) and isinstance(self.symbol_table.get(atom.var_name_tok.value), BuiltInFunction) \
+                and not self.symbol_table.get_type(atom.var_name_tok.value):
+            func = self.symbol_table.get(atom.var_name_tok.value)
 
             if self.current_tok.type == TT_NEWLINE:
-                return res.success(CallNode(atom, []))
+                return self.builtin_call(res, atom, func, [])
             elif func.name == 'get':
                 arg_nodes = []
                 arg_nodes.append(self.current_tok)
-                if self.current_tok.value in global_symbol_table.types and global_symbol_table.types.get(self.current_tok.value).startswith("array<"):
+                if (self.symbol_table.get_type(self.current_tok.value) or "").startswith("array<"):
                     res.register_advancement()
                     self.advance()
                     while self.current_tok.type == TT_LSQPAREN:
                         res.register_advancement()
                         self.advance()
-                        arg_nodes.append(self.current_tok)
+                        # A literal index is a number like any other; a name is looked up when get runs
+                        arg_nodes.append(NumberNode(self.current_tok) if self.current_tok.type == TT_INT else self.current_tok)
                         if res.error: return res
                         res.register_advancement()
                         self.advance()
@@ -997,12 +1136,13 @@ class Parser:
                         if res.error: return res
                         res.register_advancement()
                         self.advance()
-                return res.success(CallNode(atom, arg_nodes))
-            elif func.name in ('create_array', 'nombreAleatoire', 'size'):
+                return self.builtin_call(res, atom, func, arg_nodes)
+            elif func.name in ('create_array', 'create_map', 'nombreAleatoire', 'size') or func.name in BuiltInFunction.LIBRARY:
                 res = self.expected_token(TT_LPAREN, None, "(")
                 if res.error: return res
                 arg_nodes = []
-                arg_nodes.append(res.register(self.expr()))
+                if self.current_tok.type != TT_RPAREN:
+                    arg_nodes.append(res.register(self.expr()))
                 while self.current_tok.type == TT_COMMA:
                     res.register_advancement()
                     self.advance()
@@ -1010,7 +1150,7 @@ class Parser:
                     if res.error: return res
                 res = self.expected_token(TT_RPAREN, None, ")")
                 if res.error: return res
-                return res.success(CallNode(atom, arg_nodes))
+                return self.builtin_call(res, atom, func, arg_nodes)
             else:
                 arg_nodes = []
                 arg_nodes.append(res.register(self.expr()))
@@ -1019,7 +1159,7 @@ class Parser:
                     self.advance()
                     arg_nodes.append(res.register(self.expr()))
                     if res.error: return res
-                return res.success(CallNode(atom, arg_nodes))
+                return self.builtin_call(res, atom, func, arg_nodes)
 
         if self.current_tok.type == TT_LPAREN:
             res.register_advancement()
@@ -1050,6 +1190,15 @@ class Parser:
             return res.success(CallNode(atom, arg_nodes))
         return res.success(atom)
 
+    def builtin_call(self, res, atom, func, arg_nodes):
+        # A builtin's arity is fixed by its handler, so a wrong argument count
+        # is reported here instead of on every call
+        node = CallNode(atom, arg_nodes)
+        details = func.arity(len(arg_nodes))
+        if details:
+            return res.failure(InvalidSyntaxError(node.pos_start, node.pos_end, details))
+        return res.success(node)
+
     def atom(self):
         res = ParseResult()
         tok = self.current_tok
@@ -1239,25 +1388,34 @@ class Parser:
         res.register_advancement()
         self.advance()
 
-        res = self.expected_token(TT_EQ, display_value = '<--')
-        if res.error: return res
-
-        start_value = res.register(self.expr())
-        if res.error: return res
-
-        if self.current_tok.matches(TT_KEYWORD, 'to'):
-            to_downto = 0
-            res.register_advancement()
-            self.advance()
-        elif self.current_tok.matches(TT_KEYWORD, 'downto'):
-            to_downto = 1
+        if self.current_tok.matches(TT_KEYWORD, 'in'):
+            # for k in M: the keys of a map, or the elements of an array
             res.register_advancement()
             self.advance()
+            iterable = res.register(self.expr())
+            if res.error: return res
+            loop = lambda body: ForEachNode(var_name, iterable, body, True)
         else:
-            return res.failure(InvalidSyntaxError(self.current_tok.pos_start, self.current_tok.pos_end, "Expected 'to' or 'downto'"))
+            res = self.expected_token(TT_EQ, display_value = '<--')
+            if res.error: return res
 
-        end_value = res.register(self.expr())
-        if res.error: return res
+            start_value = res.register(self.expr())
+            if res.error: return res
+
+            if self.current_tok.matches(TT_KEYWORD, 'to'):
+                to_downto = 0
+                res.register_advancement()
+                self.advance()
+            elif self.current_tok.matches(TT_KEYWORD, 'downto'):
+                to_downto = 1
+                res.register_advancement()
+                self.advance()
+            else:
+                return res.failure(InvalidSyntaxError(self.current_tok.pos_start, self.current_tok.pos_end, "Expected 'to' or 'downto'"))
+
+            end_value = res.register(self.expr())
+            if res.error: return res
+            loop = lambda body: ForNode(var_name, start_value, end_value, body, to_downto, True)
 
         if self.current_tok.type == TT_NEWLINE:
             self.bns_indent_level += 1
@@ -1268,7 +1426,7 @@ class Parser:
             body = res.register(self.statements())
             if res.error: return res
 
-            return res.success(ForNode(var_name, start_value, end_value, body, to_downto, True))
+            return res.success(loop(body))
 
         else:
             return res.failure(InvalidSyntaxError(self.current_tok.pos_start, self.current_tok.pos_end, f"Expected at least one argument in the for loop"))
@@ -1336,7 +1494,7 @@ class Parser:
         if res.error: return res
         self.exp_indent_lvl -= 1
 
-        return res.success(FunctionDefNode(var_name_tok, arg_name_toks, body, return_type))
+        return res.success(FunctionDefNode(var_name_tok, arg_name_toks, body, return_type, self.symbol_table.types))
 
     ######################################
 
@@ -1460,6 +1618,9 @@ class Value:
     def notted(self):
         return None, self.illegal_operation()
 
+    def contains(self, other):
+        return None, Value.illegal_operation(other, self)
+
     def execute(self, args):
         return RTResult().failure(self.illegal_operation())
 
@@ -1604,12 +1765,55 @@ Number.false = Number(0)
 Number.true = Number(1)
 
 class String(Value):
+    # Short strings hold their text. Appending to a longer one adds a piece
+    # to a chunk list instead of copying the text: each String covers the
+    # first 'count' chunks of a list it may share with the strings it grew
+    # from, and only the one covering the whole list appends in place. The
+    # text is joined the first time it is read.
+    BUILDER_MIN_LENGTH = 256
+    # Every RUN appended pieces are joined into one chunk, so building a
+    # string one character at a time does not keep a chunk per character
+    RUN = 1024
+
     def __init__(self, value):
         super().__init__()
-        self.value = value
+        self.text = value
+        self.chunks = None
+        self.count = 0
+        self.pending = 0
+
+    @classmethod
+    def from_chunks(cls, chunks, pending):
+        string = cls(None)
+        string.chunks, string.count, string.pending = chunks, len(chunks), pending
+        return string
+
+    @property
+    def value(self):
+        if self.text is None:
+            chunks = self.chunks
+            self.text = "".join(chunks if len(chunks) == self.count else chunks[:self.count])
+        return self.text
 
     def added_to(self, other):
-        return String(self.value + str(other.value)).set_context(self.context), None
+        piece = str(other.value)
+        chunks = self.chunks
+        if chunks is None:
+            if len(self.text) + len(piece) < self.BUILDER_MIN_LENGTH:
+                return String(self.text + piece).set_context(self.context), None
+            chunks = self.chunks = [self.text]
+            self.count, self.pending = 1, 0
+        elif len(chunks) != self.count:
+            # A longer string already grew from this one and owns the list
+            chunks = chunks[:self.count]
+        chunks.append(piece)
+
+        pending = self.pending + 1
+        if pending == self.RUN:
+            # A new list, so the strings sharing the old one keep their chunks
+            chunks = chunks[:-pending] + ["".join(chunks[-pending:])]
+            pending = 0
+        return String.from_chunks(chunks, pending).set_context(self.context), None
 
     def multed_by(self, other):
         if isinstance(other, Number):
@@ -1621,7 +1825,8 @@ class String(Value):
         return len(self.value) > 0
 
     def copy(self):
-        copy = String(self.value)
+        copy = String(self.text)
+        copy.chunks, copy.count, copy.pending = self.chunks, self.count, self.pending
         copy.set_pos(self.pos_start, self.pos_end)
         copy.set_context(self.context)
         return copy
@@ -1652,118 +1857,169 @@ class List(Value):
         else:
             return None, Value.illegal_operation(self, other)
 
+    def contains(self, other):
+        key = element_key(other)
+        return Number(1 if any(element_key(element) == key for element in self.elements) else 0).set_context(self.context), None
+
     def __str__(self):
         return ", ".join([str(x) for x in self.elements])
 
     def __repr__(self):
         return f'{[x for x in self.elements]}'
 
-class BaseFunction(Value):
-    def __init__(self, name):
+class Map(Value):
+    # Entries are keyed by the raw int, float or str of each key, so a
+    # lookup is one dict access
+    def __init__(self, entries):
         super().__init__()
-        self.name = name or "<anonymous>"
+        self.entries = entries
 
-    def generate_new_context(self):
-        new_context = Context(self.name, self.context)
-        new_context.symbol_table = SymbolTable(new_context.parent.symbol_table)
-        return new_context
+    def copy(self):
+        copy = Map(self.entries)
+        copy.set_pos(self.pos_start, self.pos_end)
+        copy.set_context(self.context)
+        return copy
 
-    def check_args(self, arg_names, args):
-        res = RTResult()
-        if self.name in ("print", "create_array"):
-            return res.success(None)
-        if len(args) > len(arg_names):
-            return res.failure(RTError(self.pos_start, self.pos_end, f"{len(args) - len(arg_names)} too many arguments passed into '{self.name}'\nExpected {len(arg_names)} arguments, got {len(args)}", self.context))
-        elif len(args) < len(arg_names):
-            return res.failure(RTError(self.pos_start, self.pos_end, f"{len(arg_names) - len(args)} too few arguments passed into '{self.name}'\nExpected {len(arg_names)} arguments, got {len(args)}", self.context))
-        return res.success(None)
+    def contains(self, other):
+        found = isinstance(other, (Number, String)) and other.value in self.entries
+        return Number(1 if found else 0).set_context(self.context), None
 
-    def populate_args(self, arg_names, args, exec_ctx):
-        for i in range(len(args)):
-            arg_name = arg_names[i]
-            arg_value = args[i]
-            arg_value.set_context(exec_ctx)
-            exec_ctx.symbol_table.set(arg_name, arg_value)
+    @staticmethod
+    def key_value(key):
+        return String(key) if isinstance(key, str) else Number(key)
 
-    def check_and_populate_args(self, arg_names, args, exec_ctx):
-        res = RTResult()
-        res.register(self.check_args(arg_names, args))
-        if res.should_return(): return res
-        if len(arg_names) == 0:
-            exec_ctx.symbol_table.set("args", List(args))
-        else:
-            self.populate_args(arg_names, args, exec_ctx)
+    def is_true(self):
+        return len(self.entries) > 0
+
+    def __str__(self):
+        return "{" + ", ".join(f"{key}: {value}" for key, value in self.entries.items()) + "}"
+
+    def __repr__(self):
+        return "{" + ", ".join(f"{key!r}: {value!r}" for key, value in self.entries.items()) + "}"
+
+def element_key(element):
+    # Array elements are Numbers, Strings or '' when never set
+    return element.value if isinstance(element, (Number, String)) else element
+
+def count_elements(elements):
+    return sum(count_elements(element) if isinstance(element, list) else 1 for element in elements)
+
+def element_value(element):
+    # An element taken out of an array's storage, as a value of its own
+    if isinstance(element, list):
+        return List(element)
+    if isinstance(element, str):
+        return String(element)
+    return element
+
+def copy_elements(elements):
+    # Rows of a 2D array are plain lists, copied so the new array shares no storage
+    return [copy_elements(element) if isinstance(element, list) else element for element in elements]
+
+def map_types(var_type):
+    # 'map<str,int>' -> ('str', 'int'); no types when the map is not declared as one
+    if var_type and var_type.startswith("map<"):
+        return tuple(var_type[4:-1].split(","))
+    return None, None
+
+def type_mismatch(var_type, value):
+    if var_type in ('int', 'float'):
+        return not isinstance(value, Number)
+    if var_type == 'str':
+        return not isinstance(value, String)
+    return False
+
+class BaseFunction(Value):
+    def __init__(self, name):
+        super().__init__()
+        self.name = name or "<anonymous>"
 
+    def arity_error(self, count, arg_names, optional=0):
+        if arg_names is None:
+            return None
+        required = len(arg_names) - optional
+        expected = f"{required} to {len(arg_names)}" if optional else f"{required}"
+        if count > len(arg_names):
+            return f"{count - len(arg_names)} too many arguments passed into '{self.name}'\nExpected {expected} arguments, got {count}"
+        elif count < required:
+            return f"{required - count} too few arguments passed into '{self.name}'\nExpected {expected} arguments, got {count}"
+        return None
+
+    def check_args(self, arg_names, args, node=None, context=None):
+        res = RTResult()
+        details = self.arity_error(len(args), arg_names)
+        if details:
+            node, context = node or self, context or self.context
+            return res.failure(RTError(node.pos_start, node.pos_end, details, context))
         return res.success(None)
 
 class Function(BaseFunction):
-    def __init__(self, name, body_node, arg_name, return_type):
+    def __init__(self, name, body_node, arg_name, return_type, local_types=None, scope=None, layout=None, pure=False):
         super().__init__(name)
         self.body_node = body_node
         self.arg_name = arg_name
         self.return_type = return_type
-
-    async def execute(self, args):
+        self.local_types = local_types or {name: None for name in arg_name}
+        # Parameters come first, so argument i lands in slot i
+        self.slots, self.slot_types = layout or (
+            {name: index for index, name in enumerate(self.local_types)}, tuple(self.local_types.values()))
+        self.scope = scope
+        self.pure = pure
+
+    def check_call(self, args, node, context):
+        res = self.check_args(self.arg_name, args, node, context)
+        if res.error: return res.error
+
+        for arg_name, var_type, arg in zip(self.arg_name, self.slot_types, args):
+            if type_mismatch(var_type, arg):
+                return RTError(node.pos_start, node.pos_end, f"Parameter '{arg_name}' of '{self.name}' is of type '{var_type}', but got '{type(arg).__name__}'", context)
+        return None
+
+    def execute(self, args, interpreter):
+        return self.call(args, interpreter, self, self.context)
+
+    async def call(self, args, interpreter, node, context):
+        # Runs the function straight from its binding: 'node' is the call
+        # site and 'context' the caller, so no positioned copy is needed
         res = RTResult()
-        exec_ctx = self.generate_new_context()
-
-        method_name = f'execute_{self.name}'
-        method = getattr(self, method_name, self.no_visit_method)
-
-        if self.name == 'get':
-            if len(args) > 1:
-                if global_symbol_table.types.get(args[0].var_name_tok.value).startswith("array<"):
-                    idx_list = args[1:]
-                    idx_list_int = []
-                    for idx_node in idx_list:
-                        if not isinstance(idx_node, Number):
-                            idx_val = exec_ctx.symbol_table.get(idx_node.var_name_tok.value)
-                        elif isinstance(idx_node, VarAccessNode):
-                            idx_val = exec_ctx.symbol_table.get(idx_node.var_name_tok.value)
-                        else:
-                            idx_val = idx_node
-                        if isinstance(idx_val, Number):
-                            idx_val = int(idx_val.value)
-                        try:
-                            if isinstance(idx_val, str):
-                                idx_val = int(idx_val)
-                        except Exception:
-                            pass
-                        if not isinstance(idx_val, int):
-                            return res.failure(RTError(self.pos_start, self.pos_end, "Invalid array index", exec_ctx))
-                        idx_list_int.append(idx_val)
-                    exec_ctx.symbol_table.set("var_name", args[0].var_name_tok.value, idx_list=idx_list_int)
-                else:
-                    s = "Cannot store into 'get' Expected array as first argument"
-                    return res.failure(RTError(self.pos_start, self.pos_end, s, exec_ctx))
-            if len(args) == 1:
-                exec_ctx.symbol_table.set("var_name", args[0].var_name_tok.value)
-        else:
-            if hasattr(method, 'arg_names'):
-                arg_names = getattr(method, 'arg_names')
-            elif hasattr(method, '__func__') and hasattr(method.__func__, 'arg_names'):
-                arg_names = getattr(method.__func__, 'arg_names')
-            elif hasattr(method, '__call__') and hasattr(method.__call__, 'arg_names'):
-                arg_names = getattr(method.__call__, 'arg_names')
-            else:
-                arg_names = []
-
-            res.register(self.check_and_populate_args(arg_names, args, exec_ctx))
-            if res.should_return(): return res
-
-        try:
-            maybe_ret = method(exec_ctx)
-            if inspect.isawaitable(maybe_ret):
-                maybe_ret = await maybe_ret
-            return_value = res.register(maybe_ret)
-        except Exception as e:
-            return res.failure(RTError(self.pos_start, self.pos_end, f"Error calling builtin '{self.name}': {e}", exec_ctx))
-
-        if res.should_return(): return res
+        memo = context.session.memo if self.pure else None
+        key = memo.key(self, args) if memo is not None else None
+        if key is not None:
+            cached = memo.get(key)
+            if cached is not None:
+                return res.success(cached)
+
+        error = self.check_call(args, node, context)
+        if error: return res.failure(error)
+
+        pool = context.session.frames
+        frame = pool.acquire(self, context, node.pos_start)
+        while True:
+            frame.slots[:len(args)] = args
+            res.register(await interpreter.visit_segment(self.body_node, frame))
+            # A failed call keeps its frame out of the pool: the error's traceback still walks it
+            if res.error: return res
+            return_value = res.func_return_value
+            if type(return_value) is not TailCall:
+                break
+            # 'return f(...)' inside f: run the body again in the same frame
+            args = return_value.args
+            frame.clear()
+            frame.enter(self, context, node.pos_start)
+        return_value = return_value or Number.null
+
+        if return_value is not Number.null and type_mismatch(self.return_type, return_value):
+            pos_start, pos_end = (return_value.pos_start, return_value.pos_end) if return_value.pos_start else (node.pos_start, node.pos_end)
+            return res.failure(RTError(pos_start, pos_end, f"Function '{self.name}' returns '{self.return_type}', but got '{type(return_value).__name__}'", frame))
+
+        pool.release(frame)
+        if key is not None:
+            memo.put(key, return_value)
         return res.success(return_value)
 
     def copy(self):
-        copy = Function(self.name, self.body_node, self.arg_name, self.return_type)
+        copy = Function(self.name, self.body_node, self.arg_name, self.return_type, self.local_types, self.scope,
+                        (self.slots, self.slot_types), self.pure)
         copy.set_context(self.context)
         copy.set_pos(self.pos_start, self.pos_end)
         return copy
@@ -1772,67 +2028,49 @@ class Function(BaseFunction):
         return f"<function {self.name}>"
 
 class BuiltInFunction(BaseFunction):
+    # Handlers take the call site, the caller's context and the evaluated
+    # arguments positionally: execute_<name>(self, node, context, *args),
+    # and return a value the caller owns. 'arg_names' on a handler fixes its
+    # arity, less any trailing parameters with a default; without it the
+    # builtin is variadic. All of this is resolved once, here.
+
+    # Array algorithms and operations. Unlike the core builtins, a program
+    # may declare a variable or a function with one of these names.
+    LIBRARY = ('sort', 'search', 'sum', 'min', 'max', 'fill', 'copy', 'reverse', 'append', 'pop', 'insert')
+
     def __init__(self, name):
         super().__init__(name)
+        self.handler = getattr(type(self), f'execute_{name}', BuiltInFunction.no_visit_method)
+        self.arg_names = getattr(self.handler, 'arg_names', None)
+        self.optional = len(self.handler.__defaults__ or ()) if self.arg_names is not None else 0
 
-    async def execute(self, args):
-        res = RTResult()
-        exec_ctx = self.generate_new_context()
-
-        method_name = f'execute_{self.name}'
-        method = getattr(self, method_name, self.no_visit_method)
+    def arity(self, count):
+        return self.arity_error(count, self.arg_names, self.optional)
 
-        if self.name == 'get':
-            if len(args) > 1:
-                if global_symbol_table.types.get(args[0].var_name_tok.value).startswith("array<"):
-                    idx_list = args[1:]
-                    idx_list_int = []
-                    for idx_node in idx_list:
-                        if not isinstance(idx_node, Number):
-                            idx_val = exec_ctx.symbol_table.get(idx_node.var_name_tok.value)
-                        elif isinstance(idx_node, VarAccessNode):
-                            idx_val = exec_ctx.symbol_table.get(idx_node.var_name_tok.value)
-                        else:
-                            idx_val = idx_node
-                        if isinstance(idx_val, Number):
-                            idx_val = int(idx_val.value)
-                        try:
-                            if isinstance(idx_val, str):
-                                idx_val = int(idx_val)
-                        except Exception:
-                            pass
-                        if not isinstance(idx_val, int):
-                            return res.failure(RTError(self.pos_start, self.pos_end, "Invalid array index", exec_ctx))
-                        idx_list_int.append(idx_val)
-                    exec_ctx.symbol_table.set("var_name", args[0].var_name_tok.value, idx_list=idx_list_int)
-                else:
-                    s = "Cannot store into 'get' Expected array as first argument"
-                    return res.failure(RTError(self.pos_start, self.pos_end, s, exec_ctx))
-            if len(args) == 1:
-                exec_ctx.symbol_table.set("var_name", args[0].var_name_tok.value)
-        else:
-            if hasattr(method, 'arg_names'):
-                arg_names = getattr(method, 'arg_names')
-            elif hasattr(method, '__func__') and hasattr(method.__func__, 'arg_names'):
-                arg_names = getattr(method.__func__, 'arg_names')
-            elif hasattr(method, '__call__') and hasattr(method.__call__, 'arg_names'):
-                arg_names = getattr(method.__call__, 'arg_names')
-            else:
-                arg_names = []
-
-            res.register(self.check_and_populate_args(arg_names, args, exec_ctx))
-            if res.should_return(): return res
+    def call(self, args, interpreter, node, context):
+        try:
+            result = self.handler(self, node, context, *args)
+        except Exception as e:
+            return self.failure(e, node, context)
+        if inspect.isawaitable(result):
+            return self.guarded(result, node, context)
+        return result
 
+    async def guarded(self, result, node, context):
         try:
-            result_res = await maybe_await(method(exec_ctx))
-            return_value = res.register(result_res)
+            return await result
         except Exception as e:
-            return res.failure(RTError(self.pos_start, self.pos_end, f"Error calling builtin '{self.name}': {e}", exec_ctx))
+            return self.failure(e, node, context)
 
-        if res.should_return(): return res
-        return res.success(return_value)
+    def failure(self, e, node, context):
+        return RTResult().failure(RTError(node.pos_start, node.pos_end, f"Error calling builtin '{self.name}': {e}", context))
 
-    def no_visit_method(self, args, exec_ctx):
+    async def execute(self, args):
+        details = self.arity(len(args))
+        if details: return RTResult().failure(RTError(self.pos_start, self.pos_end, details, self.context))
+        return await maybe_await(self.call(args, None, self, self.context))
+
+    def no_visit_method(self, node, context, *args):
         raise Exception(f'No execute_{self.name} method defined')
 
     def copy(self):
@@ -1846,20 +2084,23 @@ class BuiltInFunction(BaseFunction):
 
     ######################################
 
-    def execute_create_array(self, exec_ctx):
+    def execute_create_array(self, node, context, *dimensions):
         res = RTResult()
-        dimensions = []
-        for arg in exec_ctx.symbol_table.get("args").elements:
+        for arg in dimensions:
             if not isinstance(arg, Number):
-                return res.failure(RTError(arg.pos_start, arg.pos_end, "La taille doit être un nombre", exec_ctx))
-            dimensions.append(int(arg.value))
+                return res.failure(RTError(arg.pos_start, arg.pos_end, "La taille doit être un nombre", context))
+        dimensions = [int(arg.value) for arg in dimensions]
 
-        array = ['' for _ in range(dimensions[-1])]
-        for i in dimensions[:-1][::-1]:
-            array = [array]*i
+        elements = 1
+        for dimension in dimensions:
+            elements *= max(dimension, 0)
+        try:
+            context.session.allocate(elements)
+        except LimitExceeded as e:
+            return res.failure(e.error_class(node.pos_start, node.pos_end, e.details, context))
 
         def create_nested_array(dimensions):
-            check_stop()
+            context.session.check_stop()
             if len(dimensions) == 1:
                 return ['' for _ in range(dimensions[0])]
             else:
@@ -1868,10 +2109,8 @@ class BuiltInFunction(BaseFunction):
         array = create_nested_array(dimensions)
 
         return res.success(List(array))
-    execute_create_array.arg_names = []
 
-    async def execute_print(self, exec_ctx):
-        args = exec_ctx.symbol_table.get("args").elements
+    async def execute_print(self, node, context, *args):
         s = ""
         first = True
         for arg in args:
@@ -1886,51 +2125,65 @@ class BuiltInFunction(BaseFunction):
                 first = False
 
         try:
-            web_write(s)
+            context.session.output(s)
+        except LimitExceeded as e:
+            return RTResult().failure(e.error_class(node.pos_start, node.pos_end, e.details, context))
         except Exception:
             try:
                 print(s)
             except Exception:
                 pass
         try:
-            import asyncio
-            await asyncio.sleep(0)
+            await context.session.flush()
+        except ConnectionError:
+            raise
         except Exception:
             pass
 
-        return RTResult().success(Number.null)
+        return RTResult().success(Number.null.copy())
 
-    async def execute_get(self, exec_ctx, idx=None):
+    async def execute_get(self, node, context, target=None, *indices):
+        # 'get x' and 'get T[i]' pass the target and index names unevaluated
         res = RTResult()
+        if indices and not (context.symbol_table.get_type(target.var_name_tok.value) or "").startswith("array<"):
+            s = "Cannot store into 'get' Expected array as first argument"
+            return res.failure(RTError(node.pos_start, node.pos_end, s, context))
+
+        idx_list = []
+        for index in indices:
+            if isinstance(index, VarAccessNode):
+                index = context.symbol_table.get(index.var_name_tok.value)
+            if isinstance(index, Number):
+                index = int(index.value)
+            elif isinstance(index, String):
+                try:
+                    index = int(index.value)
+                except ValueError:
+                    pass
+            if not isinstance(index, int):
+                return res.failure(RTError(node.pos_start, node.pos_end, "Invalid array index", context))
+            idx_list.append(index)
 
         try:
-            if '__js_get_input' in globals() and globals()['__js_get_input'] is not None:
-                val = globals()['__js_get_input']()
-                if val is not None:
-                    text = str(val)
-                else:
-                    text = await web_await_input()
-            else:
-                text = await web_await_input()
+            text = await context.session.read_input()
         except Exception as e:
             text = ""
 
-        var_name = exec_ctx.symbol_table.get("var_name")
-        if var_name:
+        if target is not None:
             try:
                 value = Number(int(text))
             except Exception:
                 value = String(text)
-            global_symbol_table.set(var_name, value, idx_list=None, st=True)
-            return res.success(value)
+            context.symbol_table.set(target.var_name_tok.value, value, idx_list=idx_list or None, st=True)
+            return res.success(value.copy())
 
         return res.success(String(text))
 
-    async def execute_run(self, exec_ctx):
-        fn = exec_ctx.symbol_table.get('fn')
-
+    async def execute_run(self, node, context, fn):
+        if not context.session.allow_run:
+            return RTResult().failure(RTError(node.pos_start, node.pos_end, "'run' is disabled in this session", context))
         if not isinstance(fn, String):
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, 'Second argument must be string', exec_ctx))
+            return RTResult().failure(RTError(node.pos_start, node.pos_end, 'Second argument must be string', context))
 
         fn = fn.value
 
@@ -1939,52 +2192,218 @@ class BuiltInFunction(BaseFunction):
                 script = f.read()
             f.close()
         except Exception as e:
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, f"Failed to load script \"{fn}\"\n" + str(e), exec_ctx))
+            return RTResult().failure(RTError(node.pos_start, node.pos_end, f"Failed to load script \"{fn}\"\n" + str(e), context))
 
-        _, error = await run_async(fn, script)
+        program, error = compile_program(fn, script)
+        if not error:
+            _, error = await program.run_async(session=context.session.spawn())
 
         if error:
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, f"Failed to finish executing script \"{fn}\"\n" + error.as_string(), exec_ctx))
-        return RTResult().success(Number.null)
+            return RTResult().failure(RTError(node.pos_start, node.pos_end, f"Failed to finish executing script \"{fn}\"\n" + error.as_string(), context))
+        return RTResult().success(Number.null.copy())
     execute_run.arg_names = ['fn']
 
-    def execute_SQRT(self, exec_ctx):
-        number = exec_ctx.symbol_table.get('value')
-
+    def execute_SQRT(self, node, context, number):
         if not isinstance(number, Number):
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, f"Argument must be a number, got '{type(number).__name__}'", exec_ctx))
+            return RTResult().failure(RTError(node.pos_start, node.pos_end, f"Argument must be a number, got '{type(number).__name__}'", context))
 
         result = number.value ** (1/2)
         return RTResult().success(Number(result))
     execute_SQRT.arg_names = ['value']
 
-    def execute_nombreAleatoire(self, exec_ctx):
+    def execute_nombreAleatoire(self, node, context, a, b):
         import random
-        a = exec_ctx.symbol_table.get('a')
-        b = exec_ctx.symbol_table.get('b')
 
         if not isinstance(a, Number) or not isinstance(b, Number):
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, "Arguments must be numbers", exec_ctx))
+            return RTResult().failure(RTError(node.pos_start, node.pos_end, "Arguments must be numbers", context))
 
         result = random.randint(int(a.value), int(b.value))
         return RTResult().success(Number(result))
     execute_nombreAleatoire.arg_names = ['a', 'b']
 
-    def execute_size(self, exec_ctx):
-        T = exec_ctx.symbol_table.get('T')
+    def execute_create_map(self, node, context):
+        return RTResult().success(Map({}))
+    execute_create_map.arg_names = []
 
+    def execute_size(self, node, context, T):
+        if isinstance(T, Map):
+            return RTResult().success(Number(len(T.entries)))
         if not isinstance(T, List):
-            return RTResult().failure(RTError(self.pos_start, self.pos_end, "Argument to 'size' must be an array", exec_ctx))
+            return RTResult().failure(RTError(node.pos_start, node.pos_end, "Argument to 'size' must be an array or a map", context))
 
         return RTResult().success(Number(len(T.elements)))
     execute_size.arg_names = ['T']
 
+    ######################################
+    # Array algorithms work in place on the array's own storage, so they
+    # apply to a whole array as well as to one row of a 2D array.
+
+    def elements(self, T, node, context):
+        if isinstance(T, List):
+            return T.elements, None
+        if isinstance(T, list):
+            return T, None
+        return None, RTError(node.pos_start, node.pos_end, f"Argument to '{self.name}' must be an array", context)
+
+    def compare_error(self, node, context):
+        return RTError(node.pos_start, node.pos_end, f"'{self.name}' needs an array of numbers or of strings, with every element set", context)
+
+    def execute_sort(self, node, context, T, descending=None):
+        res = RTResult()
+        elements, error = self.elements(T, node, context)
+        if error: return res.failure(error)
+        try:
+            elements.sort(key=element_key, reverse=descending is not None and descending.is_true())
+        except TypeError:
+            return res.failure(self.compare_error(node, context))
+        return res.success(Number.null.copy())
+    execute_sort.arg_names = ['T', 'descending']
+
+    def execute_search(self, node, context, T, value):
+        # Binary search in an array sorted in ascending order: the index of
+        # one occurrence of value, or -1
+        res = RTResult()
+        elements, error = self.elements(T, node, context)
+        if error: return res.failure(error)
+        key = element_key(value)
+        try:
+            index = bisect.bisect_left(elements, key, key=element_key)
+            found = index < len(elements) and element_key(elements[index]) == key
+        except TypeError:
+            return res.failure(self.compare_error(node, context))
+        return res.success(Number(index if found else -1))
+    execute_search.arg_names = ['T', 'value']
+
+    def execute_sum(self, node, context, T):
+        res = RTResult()
+        elements, error = self.elements(T, node, context)
+        if error: return res.failure(error)
+        if not all(type(element) is Number for element in elements):
+            return res.failure(RTError(node.pos_start, node.pos_end, "'sum' needs an array of numbers, with every element set", context))
+        return res.success(Number(sum(element.value for element in elements)))
+    execute_sum.arg_names = ['T']
+
+    def extremum(self, node, context, T, pick):
+        res = RTResult()
+        elements, error = self.elements(T, node, context)
+        if error: return res.failure(error)
+        if not elements:
+            return res.failure(RTError(node.pos_start, node.pos_end, f"'{self.name}' of an empty array", context))
+        try:
+            element = pick(elements, key=element_key)
+        except TypeError:
+            return res.failure(self.compare_error(node, context))
+        if not isinstance(element, (Number, String)):
+            return res.failure(self.compare_error(node, context))
+        return res.success(element.copy())
+
+    def execute_min(self, node, context, T):
+        return self.extremum(node, context, T, min)
+    execute_min.arg_names = ['T']
+
+    def execute_max(self, node, context, T):
+        return self.extremum(node, context, T, max)
+    execute_max.arg_names = ['T']
+
+    def execute_fill(self, node, context, T, value):
+        res = RTResult()
+        elements, error = self.elements(T, node, context)
+        if error: return res.failure(error)
+        for index in range(len(elements)):
+            elements[index] = value.copy()
+        return res.success(Number.null.copy())
+    execute_fill.arg_names = ['T', 'value']
+
+    def execute_copy(self, node, context, T, start=None, end=None):
+        # copy(T, start, end): a new array holding T[start] up to, but not
+        # including, T[end]. end defaults to the size of T, start to 0.
+        res = RTResult()
+        elements, error = self.elements(T, node, context)
+        if error: return res.failure(error)
+        bounds = (start, end if end is not None else Number(len(elements)))
+        if start is not None:
+            if not all(isinstance(bound, Number) for bound in bounds):
+                return res.failure(RTError(node.pos_start, node.pos_end, "The bounds of 'copy' must be numbers", context))
+            start, end = (int(bound.value) for bound in bounds)
+            if not 0 <= start <= end <= len(elements):
+                return res.failure(RTError(node.pos_start, node.pos_end, f"Cannot copy from {start} to {end} in an array of size {len(elements)}", context))
+            elements = elements[start:end]
+
+        try:
+            context.session.allocate(count_elements(elements))
+        except LimitExceeded as e:
+            return res.failure(e.error_class(node.pos_start, node.pos_end, e.details, context))
+        return res.success(List(copy_elements(elements)))
+    execute_copy.arg_names = ['T', 'start', 'end']
+
+    def execute_reverse(self, node, context, T):
+        res = RTResult()
+        elements, error = self.elements(T, node, context)
+        if error: return res.failure(error)
+        elements.reverse()
+        return res.success(Number.null.copy())
+    execute_reverse.arg_names = ['T']
+
+    ######################################
+    # The storage of an array is a Python list, so it can grow and shrink in
+    # place: append is amortized O(1), pop from the end O(1).
+
+    def execute_append(self, node, context, T, value):
+        res = RTResult()
+        elements, error = self.elements(T, node, context)
+        if error: return res.failure(error)
+        try:
+            context.session.allocate(1)
+        except LimitExceeded as e:
+            return res.failure(e.error_class(node.pos_start, node.pos_end, e.details, context))
+        elements.append(value)
+        return res.success(Number.null.copy())
+    execute_append.arg_names = ['T', 'value']
+
+    def execute_pop(self, node, context, T, index=None):
+        # pop(T) removes and returns the last element, pop(T, i) the element at i
+        res = RTResult()
+        elements, error = self.elements(T, node, context)
+        if error: return res.failure(error)
+        if index is None:
+            if not elements:
+                return res.failure(RTError(node.pos_start, node.pos_end, "Cannot pop from an empty array", context))
+            context.session.release(1)
+            return res.success(element_value(elements.pop()))
+        if not isinstance(index, Number):
+            return res.failure(RTError(node.pos_start, node.pos_end, "The index must be a number", context))
+        i = int(index.value)
+        if not 0 <= i < len(elements):
+            return res.failure(RTError(node.pos_start, node.pos_end, f"Cannot pop index {i} from an array of size {len(elements)}", context))
+        context.session.release(1)
+        return res.success(element_value(elements.pop(i)))
+    execute_pop.arg_names = ['T', 'index']
+
+    def execute_insert(self, node, context, T, index, value):
+        res = RTResult()
+        elements, error = self.elements(T, node, context)
+        if error: return res.failure(error)
+        if not isinstance(index, Number):
+            return res.failure(RTError(node.pos_start, node.pos_end, "The index must be a number", context))
+        i = int(index.value)
+        if not 0 <= i <= len(elements):
+            return res.failure(RTError(node.pos_start, node.pos_end, f"Cannot insert at index {i} in an array of size {len(elements)}", context))
+        try:
+            context.session.allocate(1)
+        except LimitExceeded as e:
+            return res.failure(e.error_class(node.pos_start, node.pos_end, e.details, context))
+        elements.insert(i, value)
+        return res.success(Number.null.copy())
+    execute_insert.arg_names = ['T', 'index', 'value']
+
 BuiltInFunction.print = BuiltInFunction('print')
 BuiltInFunction.get = BuiltInFunction('get')
 BuiltInFunction.run = BuiltInFunction('run')
 BuiltInFunction.SQRT = BuiltInFunction('SQRT')
 BuiltInFunction.nombreAleatoire = BuiltInFunction('nombreAleatoire')
 BuiltInFunction.size = BuiltInFunction('size')
+BuiltInFunction.create_map = BuiltInFunction('create_map')
+BuiltInFunction.library = {name: BuiltInFunction(name) for name in BuiltInFunction.LIBRARY}
 
 
 ######################################
@@ -1992,11 +2411,84 @@ BuiltInFunction.size = BuiltInFunction('size')
 ######################################
 
 class Context:
-    def __init__(self, display_name, parent=None, parent_entry_pos=None):
+    def __init__(self, display_name, parent=None, parent_entry_pos=None, session=None):
         self.display_name = display_name
         self.parent = parent
         self.parent_entry_pos = parent_entry_pos
         self.symbol_table = None
+        self.session = session if session or not parent else parent.session
+        self.loop_cache = None
+
+class Frame(Context):
+    # The context of one user function call. It is its own symbol table:
+    # parameters and locals live in slots laid out when the function was
+    # defined, every other name resolves in the scope it was defined in.
+    def __init__(self):
+        super().__init__(None)
+        self.symbol_table = self
+        self.slots = []
+        self.index = {}
+        self.types = ()
+        self.scope = None
+        self.function = None
+
+    def enter(self, function, parent, entry_pos):
+        self.function = function
+        self.display_name = function.name
+        self.parent = parent
+        self.parent_entry_pos = entry_pos
+        self.session = parent.session
+        self.loop_cache = None
+        self.index = function.slots
+        self.types = function.slot_types
+        self.scope = function.scope
+        self.slots.extend(repeat(None, len(self.types)))
+        return self
+
+    def clear(self):
+        # Values created in the call may outlive it and still point here
+        self.parent = self.session = self.scope = self.function = None
+        self.display_name = self.parent_entry_pos = None
+        self.loop_cache = None
+        self.slots.clear()
+
+    def get(self, name):
+        index = self.index.get(name)
+        if index is None:
+            return self.scope.get(name)
+        return self.slots[index]
+
+    def get_type(self, name):
+        index = self.index.get(name)
+        if index is None:
+            return self.scope.get_type(name)
+        return self.types[index]
+
+    def set(self, name, value, var_type=None, idx_list=None, st=False):
+        index = self.index.get(name)
+        if index is None:
+            self.scope.set(name, value, var_type, idx_list, st)
+        elif idx_list and st:
+            SymbolTable.set_element(self.slots[index], idx_list, value)
+        else:
+            self.slots[index] = value
+
+class FramePool:
+    # Frames are recycled across calls, so a call costs no Context or
+    # SymbolTable allocation once the pool is warm
+    LIMIT = 256
+
+    def __init__(self):
+        self.free = []
+
+    def acquire(self, function, parent, entry_pos):
+        frame = self.free.pop() if self.free else Frame()
+        return frame.enter(function, parent, entry_pos)
+
+    def release(self, frame):
+        frame.clear()
+        if len(self.free) < self.LIMIT:
+            self.free.append(frame)
 
 
 ######################################
@@ -2023,22 +2515,7 @@ class SymbolTable:
 
     def set(self, name, value, var_type=None, idx_list=None, st=False):
         if idx_list and st:
-            current = self.symbols[name]
-            for idx in idx_list[:-1]:
-                if isinstance(current, List):
-                    current = current.elements[int(idx)]
-                elif isinstance(current, list):
-                    current = current[int(idx)]
-                else:
-                    raise Exception(f"Impossible d'accéder à l'index {idx} sur un type non indexable : {type(current).__name__}")
-
-            final_idx = int(idx_list[-1])
-            if isinstance(current, List):
-                current.elements[final_idx] = value
-            elif isinstance(current, list):
-                current[final_idx] = value
-            else:
-                raise Exception(f"Impossible d'affecter une valeur à l'index {final_idx} sur {type(current).__name__}")
+            self.set_element(self.symbols[name], idx_list, value)
         else:
             if idx_list and not st:
                 value += str(idx_list)
@@ -2046,6 +2523,24 @@ class SymbolTable:
             if var_type:
                 self.types[name] = var_type
 
+    @staticmethod
+    def set_element(current, idx_list, value):
+        for idx in idx_list[:-1]:
+            if isinstance(current, List):
+                current = current.elements[int(idx)]
+            elif isinstance(current, list):
+                current = current[int(idx)]
+            else:
+                raise Exception(f"Impossible d'accéder à l'index {idx} sur un type non indexable : {type(current).__name__}")
+
+        final_idx = int(idx_list[-1])
+        if isinstance(current, List):
+            current.elements[final_idx] = value
+        elif isinstance(current, list):
+            current[final_idx] = value
+        else:
+            raise Exception(f"Impossible d'affecter une valeur à l'index {final_idx} sur {type(current).__name__}")
+
     def remove(self, name):
         del self.symbols[name]
         del self.types[name]
@@ -2055,8 +2550,220 @@ class SymbolTable:
 # INTERPRETER
 ######################################
 
+class TraceHook:
+    EVENTS = ('on_node_enter', 'on_node_exit', 'on_call', 'on_return', 'on_assign', 'on_print', 'on_get')
+
+    def on_node_enter(self, node, context): pass
+    def on_node_exit(self, node, context, result): pass
+    def on_call(self, name, node, context): pass
+    def on_return(self, name, result, node, context): pass
+    def on_assign(self, name, value, node, context): pass
+    def on_print(self, text): pass
+    def on_get(self, text): pass
+
+    @classmethod
+    def listeners(cls, hooks, event):
+        # Only hooks that override an event listen to it; the rest cost nothing
+        default = getattr(cls, event)
+        return [getattr(hook, event) for hook in hooks
+                if getattr(type(hook), event, default) is not default]
+
+class TailCall:
+    # Returned in place of a value by 'return f(...)' inside f itself
+    __slots__ = ('args',)
+
+    def __init__(self, args):
+        self.args = args
+
+class Segment:
+    # Awaited by a caller to run a coroutine as a new segment of the
+    # continuation stack instead of nesting it inside the caller's
+    __slots__ = ('coroutine',)
+
+    def __init__(self, coroutine):
+        self.coroutine = coroutine
+
+    def __await__(self):
+        return (yield self)
+
+class Trampoline:
+    # Drives a coroutine whose calls are split into Segments. Suspended
+    # segments wait in a list rather than on the Python stack, so DAUPS
+    # recursion is bounded by RunLimits.max_call_depth, not by Python's
+    # recursion limit. Anything else a segment yields (asyncio futures,
+    # sleep(0)) is passed through to the event loop.
+    __slots__ = ('coroutine',)
+
+    def __init__(self, coroutine):
+        self.coroutine = coroutine
+
+    def __await__(self):
+        stack = [self.coroutine]
+        value = error = None
+        while True:
+            coroutine = stack[-1]
+            try:
+                if error is None:
+                    request = coroutine.send(value)
+                else:
+                    error, thrown = None, error
+                    request = coroutine.throw(thrown)
+            except StopIteration as stop:
+                stack.pop()
+                if not stack:
+                    return stop.value
+                value = stop.value
+                continue
+            except BaseException as e:
+                stack.pop()
+                if not stack:
+                    raise
+                error = e
+                continue
+
+            if type(request) is Segment:
+                stack.append(request.coroutine)
+                value = None
+                continue
+            try:
+                value = yield request
+            except GeneratorExit:
+                for coroutine in reversed(stack):
+                    coroutine.close()
+                raise
+            except BaseException as e:
+                error = e
+
 class Interpreter:
+    TRACED_METHODS = ('visit', 'visit_CallNode', 'visit_TailCallNode', 'visit_VarAssignNode', 'visit_IndexAssignNode')
+
+    def __init__(self, hooks=None, session=None, stackless=False):
+        self.nodes_evaluated = 0
+        self.hooks = list(hooks or [])
+        self.session = session
+        self.stackless = stackless
+        if self.hooks or session:
+            self.specialize()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        self.specialize()
+        return hook
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+        self.specialize()
+
+    def specialize(self):
+        # Rebuild the traced entry points from the class methods, wrapping
+        # only the events some hook listens to. With no hooks the instance
+        # falls back to the plain class methods.
+        for name in self.TRACED_METHODS:
+            self.__dict__.pop(name, None)
+        if self.session is not None:
+            self.session.__dict__.pop('output', None)
+            self.session.__dict__.pop('read_input', None)
+
+        listen = lambda event: TraceHook.listeners(self.hooks, event)
+        enter, leave = listen('on_node_enter'), listen('on_node_exit')
+        calls, returns = listen('on_call'), listen('on_return')
+        assigns = listen('on_assign')
+        prints, gets = listen('on_print'), listen('on_get')
+
+        if enter or leave:
+            visit = self.visit
+            async def traced_visit(node, context):
+                for callback in enter:
+                    callback(node, context)
+                # Every enter gets its exit, with no result when the node raised,
+                # so hooks that keep a stack (MemoryProfiler) stay balanced
+                result = None
+                try:
+                    result = await visit(node, context)
+                    return result
+                finally:
+                    for callback in leave:
+                        callback(node, context, result)
+            self.visit = traced_visit
+
+        if calls or returns:
+            visit_call, visit_tail_call = self.visit_CallNode, self.visit_TailCallNode
+            # Tail calls rerun the body in the caller's frame, so each one
+            # returns when the call that started the chain does
+            tail_calls = []
+            async def traced_call(node, context):
+                name = node.node_to_call.var_name_tok.value if isinstance(node.node_to_call, VarAccessNode) else None
+                for callback in calls:
+                    callback(name, node, context)
+                tail_calls.append([])
+                try:
+                    result = await visit_call(node, context)
+                finally:
+                    chain = tail_calls.pop()
+                for call in reversed(chain):
+                    for callback in returns:
+                        callback(name, result, call, context)
+                for callback in returns:
+                    callback(name, result, node, context)
+                return result
+            async def traced_tail_call(node, context):
+                result = await visit_tail_call(node, context)
+                if type(result.func_return_value) is TailCall and tail_calls:
+                    call = node.return_node.node_to_return
+                    for callback in calls:
+                        callback(call.node_to_call.var_name_tok.value, call, context)
+                    tail_calls[-1].append(call)
+                return result
+            self.visit_CallNode = traced_call
+            self.visit_TailCallNode = traced_tail_call
+
+        if assigns:
+            def traced_assign(visit_assign, target):
+                async def traced(node, context):
+                    result = await visit_assign(node, context)
+                    if not result.error:
+                        name = target(node)
+                        for callback in assigns:
+                            callback(name, result.value, node, context)
+                    return result
+                return traced
+            self.visit_VarAssignNode = traced_assign(self.visit_VarAssignNode, lambda node: node.var_name_tok.value)
+            self.visit_IndexAssignNode = traced_assign(
+                self.visit_IndexAssignNode,
+                lambda node: getattr(getattr(node.target_node.target_node, 'var_name_tok', None), 'value', None))
+
+        session = self.session
+        if session is not None and prints:
+            output = session.output
+            def traced_output(s):
+                for callback in prints:
+                    callback(s)
+                output(s)
+            session.output = traced_output
+
+        if session is not None and gets:
+            read_input = session.read_input
+            async def traced_read_input():
+                text = await read_input()
+                for callback in gets:
+                    callback(text)
+                return text
+            session.read_input = traced_read_input
+
+    def evaluate(self, node, context):
+        # Entry point for a whole statement: in stackless mode it drives the
+        # continuation stack that user function bodies are pushed onto
+        if self.stackless:
+            return Trampoline(self.visit(node, context))
+        return self.visit(node, context)
+
+    def visit_segment(self, node, context):
+        if self.stackless:
+            return Segment(self.visit(node, context))
+        return self.visit(node, context)
+
     def visit(self, node, context):
+        self.nodes_evaluated += 1
         method_name = f'visit_{type(node).__name__}'
         method = getattr(self, method_name, self.no_visit_method)
         result = method(node, context)
@@ -2079,9 +2786,12 @@ class Interpreter:
 
         for element_node in node.element_nodes:
             try:
-                check_stop()
+                if context.session.step():
+                    await context.session.pause()
             except KeyboardInterrupt:
                 return res.failure(RTError(node.pos_start, node.pos_end, "Execution stopped by user", context))
+            except LimitExceeded as e:
+                return res.failure(e.as_error(node, context))
 
             elements.append(res.register(await self.visit(element_node, context)))
             if res.should_return(): return res
@@ -2096,7 +2806,7 @@ class Interpreter:
         if not value:
 
             if context.symbol_table.get_type(var_name):
-                return res.success(Number.null)
+                return res.success(Number.null.copy().set_pos(node.pos_start, node.pos_end).set_context(context))
             return res.failure(RTError(node.pos_start, node.pos_end, f"'{var_name}' is not defined", context))
 
         value = value.copy().set_pos(node.pos_start, node.pos_end).set_context(context)
@@ -2113,12 +2823,8 @@ class Interpreter:
         if res.should_return(): return res
 
         var_type = context.symbol_table.get_type(var_name)
-        if var_type == 'int' and not isinstance(value, Number):
-            return res.failure(RTError(node.value_node.pos_start, node.value_node.pos_end, f"Variable '{var_name}' is of type 'int', but got '{type(value).__name__}'", context))
-        elif var_type == 'float' and not isinstance(value, Number):
-            return res.failure(RTError(node.value_node.pos_start, node.value_node.pos_end, f"Variable '{var_name}' is of type 'float', but got '{type(value).__name__}'", context))
-        elif var_type == 'str' and not isinstance(value, String):
-            return res.failure(RTError(node.value_node.pos_start, node.value_node.pos_end, f"Variable '{var_name}' is of type 'str', but got '{type(value).__name__}'", context))
+        if type_mismatch(var_type, value):
+            return res.failure(RTError(node.value_node.pos_start, node.value_node.pos_end, f"Variable '{var_name}' is of type '{var_type}', but got '{type(value).__name__}'", context))
 
         context.symbol_table.set(var_name, value)
         return res.success(value)
@@ -2127,6 +2833,8 @@ class Interpreter:
         res = RTResult()
         target_val = res.register(await self.visit(node.target_node.target_node, context))
         if res.should_return(): return res
+        if isinstance(target_val, Map):
+            return await self.assign_entry(node, target_val, context)
         indices = []
         for index_node in node.target_node.index_nodes:
             idx_value = res.register(await self.visit(index_node, context))
@@ -2147,6 +2855,27 @@ class Interpreter:
 
         return res.success(new_value)
 
+    async def assign_entry(self, node, target, context):
+        res = RTResult()
+        index_nodes = node.target_node.index_nodes
+        if len(index_nodes) != 1:
+            return res.failure(RTError(node.pos_start, node.pos_end, "A map entry takes exactly one key", context))
+        key = res.register(await self.visit(index_nodes[0], context))
+        if res.should_return(): return res
+        value = res.register(await self.visit(node.value_node, context))
+        if res.should_return(): return res
+
+        base = node.target_node.target_node
+        name = base.var_name_tok.value if isinstance(base, VarAccessNode) else None
+        key_type, value_type = map_types(context.symbol_table.get_type(name) if name else None)
+        if not isinstance(key, (Number, String)) or type_mismatch(key_type, key):
+            return res.failure(RTError(index_nodes[0].pos_start, index_nodes[0].pos_end, f"Keys of '{name}' are of type '{key_type or 'int or str'}', but got '{type(key).__name__}'", context))
+        if type_mismatch(value_type, value):
+            return res.failure(RTError(node.value_node.pos_start, node.value_node.pos_end, f"Values of '{name}' are of type '{value_type}', but got '{type(value).__name__}'", context))
+
+        target.entries[key.value] = value
+        return res.success(value)
+
 
     BIN_OP_FUNCTIONS = {
         TT_PLUS: lambda left, right: left.added_to(right),
@@ -2166,7 +2895,8 @@ class Interpreter:
 
     KEYWORD_OP_FUNCTIONS = {
         'and': lambda left, right: left.anded_by(right),
-        'or': lambda left, right: left.ored_by(right)
+        'or': lambda left, right: left.ored_by(right),
+        'in': lambda left, right: right.contains(left) if isinstance(right, Value) else (None, Value.illegal_operation(left, right))
     }
 
     async def visit_BinOpNode(self, node, context):
@@ -2225,27 +2955,32 @@ class Interpreter:
 
     async def visit_WhileNode(self, node, context):
         res = RTResult()
-        elements = []
+        elements = None if node.should_return_null else []
 
         while True:
             try:
-                check_stop()
+                if context.session.step():
+                    await context.session.pause()
             except KeyboardInterrupt:
                 return res.failure(RTError(node.pos_start, node.pos_end, "Execution stopped by user", context))
+            except LimitExceeded as e:
+                return res.failure(e.as_error(node, context))
 
             condition = res.register(await self.visit(node.condition_node, context))
             if res.should_return(): return res
 
             if not condition.is_true(): break
 
-            elements.append(res.register(await self.visit(node.body_node, context)))
+            value = res.register(await self.visit(node.body_node, context))
             if res.should_return(): return res
+            if elements is not None:
+                elements.append(value)
 
         return res.success(Number.null if node.should_return_null else List(elements).set_context(context).set_pos(node.pos_start, node.pos_end))
 
     async def visit_ForNode(self, node, context):
         res = RTResult()
-        elements = []
+        elements = None if node.should_return_null else []
 
         start_value = res.register(await self.visit(node.start_value_node, context))
         if res.should_return(): return res
@@ -2264,14 +2999,52 @@ class Interpreter:
 
         while condition():
             try:
-                check_stop()
+                if context.session.step():
+                    await context.session.pause()
             except KeyboardInterrupt:
                 return res.failure(RTError(node.pos_start, node.pos_end, "Execution stopped by user", context))
+            except LimitExceeded as e:
+                return res.failure(e.as_error(node, context))
 
             context.symbol_table.set(node.var_name_tok.value, Number(i))
             i += add
-            elements.append(res.register(await self.visit(node.body_node, context)))
+            value = res.register(await self.visit(node.body_node, context))
             if res.should_return(): return res
+            if elements is not None:
+                elements.append(value)
+
+        return res.success(Number.null if node.should_return_null else List(elements).set_context(context).set_pos(node.pos_start, node.pos_end))
+
+    async def visit_ForEachNode(self, node, context):
+        res = RTResult()
+        elements = None if node.should_return_null else []
+
+        iterable = res.register(await self.visit(node.iterable_node, context))
+        if res.should_return(): return res
+
+        # A snapshot, so the body may add or remove entries as it goes
+        if isinstance(iterable, Map):
+            items, item_value = list(iterable.entries), Map.key_value
+        elif isinstance(iterable, List):
+            # Rows of a 2D array and unset elements are stored raw
+            items, item_value = list(iterable.elements), element_value
+        else:
+            return res.failure(RTError(node.iterable_node.pos_start, node.iterable_node.pos_end, "Expected a map or an array after 'in'", context))
+
+        for item in items:
+            try:
+                if context.session.step():
+                    await context.session.pause()
+            except KeyboardInterrupt:
+                return res.failure(RTError(node.pos_start, node.pos_end, "Execution stopped by user", context))
+            except LimitExceeded as e:
+                return res.failure(e.as_error(node, context))
+
+            context.symbol_table.set(node.var_name_tok.value, item_value(item))
+            value = res.register(await self.visit(node.body_node, context))
+            if res.should_return(): return res
+            if elements is not None:
+                elements.append(value)
 
         return res.success(Number.null if node.should_return_null else List(elements).set_context(context).set_pos(node.pos_start, node.pos_end))
 
@@ -2281,7 +3054,8 @@ class Interpreter:
         func_name = node.var_name_tok.value if node.var_name_tok else None
         body_node = node.body_node
         arg_names = [arg_name.value for arg_name in node.arg_name_toks]
-        func_value = Function(func_name, body_node, arg_names, node.return_type).set_context(context).set_pos(node.pos_start, node.pos_end)
+        func_value = Function(func_name, body_node, arg_names, node.return_type, node.local_types, context.symbol_table,
+                              pure=node.pure).set_context(context).set_pos(node.pos_start, node.pos_end)
 
         if node.var_name_tok:
             context.symbol_table.set(func_name, func_value)
@@ -2292,9 +3066,27 @@ class Interpreter:
         res = RTResult()
         args = []
 
-        value_to_call = res.register(await self.visit(node.node_to_call, context))
-        if res.should_return(): return res
-        value_to_call = value_to_call.copy().set_pos(node.pos_start, node.pos_end)
+        # Monomorphic inline cache: the function this call site last resolved
+        # and its bound call. Rebinding the name fails the identity check.
+        callee = node.node_to_call
+        value_to_call = context.symbol_table.get(callee.var_name_tok.value) if type(callee) is VarAccessNode else None
+        cache = node.call_cache
+        if cache is not None and cache[0] is value_to_call:
+            call, user_call = cache[1], cache[2]
+        else:
+            if not isinstance(value_to_call, BaseFunction):
+                value_to_call = res.register(await self.visit(callee, context))
+                if res.should_return(): return res
+                if not isinstance(value_to_call, BaseFunction):
+                    return res.failure(RTError(node.pos_start, node.pos_end, f"'{value_to_call}' is not a function", context))
+            call, user_call = value_to_call.call, isinstance(value_to_call, Function)
+            if not user_call:
+                # A call site always passes the same number of arguments, so
+                # checking a builtin's arity once covers every later call
+                details = value_to_call.arity(len(node.arg_nodes))
+                if details: return res.failure(RTError(node.pos_start, node.pos_end, details, context))
+            if type(callee) is VarAccessNode:
+                node.call_cache = (value_to_call, call, user_call)
 
         for arg_node in node.arg_nodes:
             if isinstance(arg_node, Token) and arg_node.type == TT_IDENTIFIER:
@@ -2305,17 +3097,32 @@ class Interpreter:
             args.append(arg_value)
 
         try:
-            check_stop()
+            if context.session.step():
+                await context.session.pause()
         except KeyboardInterrupt:
             return res.failure(RTError(node.pos_start, node.pos_end, "Execution stopped by user", context))
+        except LimitExceeded as e:
+            return res.failure(e.as_error(node, context))
 
-        maybe_ret = value_to_call.execute(args)
-        if inspect.isawaitable(maybe_ret):
-            maybe_ret = await maybe_ret
+        session = context.session
+        if user_call:
+            try:
+                session.enter_call()
+            except LimitExceeded as e:
+                return res.failure(e.as_error(node, context))
+        try:
+            maybe_ret = call(args, self, node, context)
+            if inspect.isawaitable(maybe_ret):
+                maybe_ret = await maybe_ret
+        finally:
+            if user_call:
+                session.call_depth -= 1
         return_value = res.register(maybe_ret)
         if res.should_return(): return res
-        return_value = return_value.copy().set_pos(node.pos_start, node.pos_end).set_context(context)
-        return res.success(return_value)
+        # Builtins hand back a fresh value; a user function's may be shared
+        if user_call:
+            return_value = return_value.copy()
+        return res.success(return_value.set_pos(node.pos_start, node.pos_end).set_context(context))
 
     async def visit_ReturnNode(self, node, context):
         res = RTResult()
@@ -2328,6 +3135,32 @@ class Interpreter:
 
         return res.success_return(value)
 
+    async def visit_TailCallNode(self, node, context):
+        res = RTResult()
+        call = node.return_node.node_to_return
+        callee = context.symbol_table.get(call.node_to_call.var_name_tok.value)
+        # The name may have been rebound to something else since the function was compiled
+        if not isinstance(context, Frame) or not isinstance(callee, Function) or callee.body_node is not context.function.body_node:
+            return await self.visit(node.return_node, context)
+
+        args = []
+        for arg_node in call.arg_nodes:
+            args.append(res.register(await self.visit(arg_node, context)))
+            if res.should_return(): return res
+
+        try:
+            if context.session.step():
+                await context.session.pause()
+        except KeyboardInterrupt:
+            return res.failure(RTError(call.pos_start, call.pos_end, "Execution stopped by user", context))
+        except LimitExceeded as e:
+            return res.failure(e.as_error(call, context))
+
+        error = callee.check_call(args, call, context)
+        if error: return res.failure(error)
+        context.session.function_calls += 1
+        return res.success_return(TailCall(args))
+
     async def visit_IndexAccessNode(self, node, context):
         res = RTResult()
         current = res.register(await self.visit(node.target_node, context))
@@ -2337,6 +3170,11 @@ class Interpreter:
             for index_node in node.index_nodes:
                 index = res.register(await self.visit(index_node, context))
                 if res.should_return(): return res
+                if isinstance(current, Map):
+                    if not isinstance(index, (Number, String)) or index.value not in current.entries:
+                        return res.failure(RTError(index_node.pos_start, index_node.pos_end, f"Key {index!r} is not in the map", context))
+                    current = current.entries[index.value]
+                    continue
                 if not isinstance(index, Number):
                     return res.failure(RTError(index_node.pos_start, index_node.pos_end, "The index must be a number", context))
                 idx = int(index.value)
@@ -2349,27 +3187,1009 @@ class Interpreter:
         except Exception:
             return res.failure(RTError(node.pos_start, node.pos_end, f"Index access error (probably out of bounds)", context))
 
+        # Like a variable read, the element belongs to the reading context from here on
+        if not isinstance(current, (list, str)):
+            current = current.copy().set_pos(node.pos_start, node.pos_end).set_context(context)
         return res.success(current)
 
+    def visit_StatementProbe(self, node, context):
+        context.session.coverage_hits[node.index] = 1
+        return self.visit(node.node, context)
+
+    def visit_LoopScopeNode(self, node, context):
+        # Values cached by hoisted expressions are only valid for one pass of the loop
+        cache = context.loop_cache
+        if cache is None:
+            cache = context.loop_cache = {}
+        for slot in node.slots:
+            cache.pop(slot, None)
+        return self.visit(node.loop_node, context)
+
+    async def visit_HoistedNode(self, node, context):
+        cached = context.loop_cache.get(node.slot)
+        if cached is not None:
+            return RTResult().success(cached.copy().set_pos(node.pos_start, node.pos_end).set_context(context))
+
+        # Evaluated where the original expression was, so errors surface at the same point
+        res = RTResult()
+        value = res.register(await self.visit(node.node, context))
+        if res.should_return(): return res
+        # An index read can give a raw row or an unset '' element, which are left uncached
+        if not isinstance(value, (list, str)):
+            context.loop_cache[node.slot] = value
+        return res.success(value)
+
+    async def visit_InductionNode(self, node, context):
+        # var * factor while var steps by one: keep a running product
+        state = context.loop_cache.get(node.slot)
+        current = context.symbol_table.get(node.var_name)
+        i = current.value if isinstance(current, Number) else None
+        if state is not None and type(i) is int:
+            delta = i - state[0]
+            if delta == 1:
+                value = state[1] + state[2]
+            elif delta == -1:
+                value = state[1] - state[2]
+            elif delta == 0:
+                value = state[1]
+            else:
+                value = i * state[2]
+            state[0], state[1] = i, value
+            return RTResult().success(Number(value).set_context(context).set_pos(node.pos_start, node.pos_end))
+
+        res = RTResult()
+        product = res.register(await self.visit(node.original_node, context))
+        if res.should_return(): return res
+        if type(i) is int and isinstance(product, Number) and type(product.value) is int:
+            factor = res.register(await self.visit(node.factor_node, context))
+            if res.should_return(): return res
+            if type(factor.value) is int:
+                context.loop_cache[node.slot] = [i, product.value, factor.value]
+        return res.success(product)
+
+
+######################################
+# OPTIMIZER
+######################################
+
+class Optimizer:
+    CONSTANT_NAMES = ('NULL', 'false', 'true', 'Pi')
+    MAX_POWER = 64
+    MAX_STRING = 4096
+
+    def __init__(self, symbol_table):
+        self.symbol_table = symbol_table
+        self.constants = {}
+
+    def optimize(self, nodes):
+        # Builtin constants fold unless some code could rebind the name
+        # (a parameter, loop variable or get target of the same name)
+        bound = self.bound_names(nodes)
+        self.constants = {
+            name: self.symbol_table.get(name) for name in self.CONSTANT_NAMES
+            if name not in bound and self.symbol_table.get(name) is not None
+        }
+        return [self.visit(node) for node in nodes]
+
+    def bound_names(self, root):
+        names = set()
+        stack = [root]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, (list, tuple)):
+                stack.extend(item)
+            elif isinstance(item, Token):
+                if item.type == TT_IDENTIFIER:
+                    names.add(item.value)
+            elif isinstance(item, Node):
+                if isinstance(item, (VarAccessNode, NumberNode, StringNode)):
+                    continue
+                if isinstance(item, VarAssignNode):
+                    names.add(item.var_name_tok.value)
+                stack.extend(item.__dict__.values())
+        return names
+
+    def visit(self, node):
+        method = getattr(self, f'visit_{type(node).__name__}', self.visit_children)
+        return method(node)
+
+    def visit_children(self, node):
+        for name, value in node.__dict__.items():
+            if isinstance(value, Node):
+                setattr(node, name, self.visit(value) or self.empty(value))
+            elif isinstance(value, list) and any(isinstance(item, Node) for item in value):
+                setattr(node, name, [self.visit(item) or self.empty(item) if isinstance(item, Node) else item for item in value])
+        return node
+
+    def empty(self, node):
+        return ListNode([], node.pos_start, node.pos_end)
+
+    ######################################
+
+    def constant(self, node):
+        if isinstance(node, NumberNode):
+            return Number(node.tok.value)
+        if isinstance(node, StringNode):
+            return String(node.tok.value)
+        return None
+
+    def constant_node(self, value, node):
+        # The folded node keeps the span of the expression it replaces, so
+        # later runtime errors still point at the same source
+        if isinstance(value, Number):
+            tok_type = TT_FLOAT if isinstance(value.value, float) else TT_INT
+            return NumberNode(Token(tok_type, value.value, node.pos_start, node.pos_end))
+        if isinstance(value, String):
+            return StringNode(Token(TT_STRING, value.value, node.pos_start, node.pos_end))
+        return node
+
+    def fold(self, operation, node, *operands):
+        # Anything that would fail at runtime is left in place to fail there,
+        # with its original position
+        try:
+            result, error = operation(*operands)
+        except Exception:
+            return node
+        if error or result is None:
+            return node
+        if isinstance(result, String) and len(result.value) > self.MAX_STRING:
+            return node
+        return self.constant_node(result, node)
+
+    def visit_VarAccessNode(self, node):
+        value = self.constants.get(node.var_name_tok.value)
+        if value is None:
+            return node
+        return self.constant_node(value, node)
+
+    def visit_BinOpNode(self, node):
+        node.left_node = self.visit(node.left_node)
+        node.right_node = self.visit(node.right_node)
+        left, right = self.constant(node.left_node), self.constant(node.right_node)
+        if left is None or right is None:
+            return node
+        if node.op_tok.type == TT_POW and (not isinstance(right.value, (int, float)) or abs(right.value) > self.MAX_POWER):
+            return node
+
+        if node.op_tok.type == TT_KEYWORD:
+            operation = Interpreter.KEYWORD_OP_FUNCTIONS.get(node.op_tok.value)
+        else:
+            operation = Interpreter.BIN_OP_FUNCTIONS.get(node.op_tok.type)
+        if operation is None:
+            return node
+        return self.fold(operation, node, left, right)
+
+    def visit_UnaryOpNode(self, node):
+        node.node = self.visit(node.node)
+        operand = self.constant(node.node)
+        if operand is None:
+            return node
+        if node.op_tok.type == TT_MINUS:
+            return self.fold(lambda value: value.multed_by(Number(-1)), node, operand)
+        if node.op_tok.matches(TT_KEYWORD, 'not'):
+            return self.fold(lambda value: value.notted(), node, operand)
+        return node
+
+    def visit_IfNode(self, node):
+        cases = []
+        else_case = node.else_case
+        for condition, expr, should_return_null in node.cases:
+            condition = self.visit(condition)
+            expr = self.visit(expr) or self.empty(expr)
+            value = self.constant(condition)
+            if value is None:
+                cases.append((condition, expr, should_return_null))
+            elif value.is_true():
+                # Every later case, and the else, is unreachable
+                else_case = (expr, should_return_null)
+                break
+        else:
+            if else_case:
+                else_case = (self.visit(else_case[0]) or self.empty(else_case[0]), else_case[1])
+
+        if cases:
+            node.cases = cases
+            node.else_case = else_case
+            return node
+        return else_case[0] if else_case else None
+
+    def visit_WhileNode(self, node):
+        node.condition_node = self.visit(node.condition_node)
+        value = self.constant(node.condition_node)
+        if value is not None and not value.is_true() and node.should_return_null:
+            return None
+        node.body_node = self.visit(node.body_node) or self.empty(node.body_node)
+        return node
+
+    def visit_ListNode(self, node):
+        statements = []
+        for element in node.element_nodes:
+            element = self.visit(element)
+            # Dropped branches and bare literals have no effect
+            if element is None or isinstance(element, (NumberNode, StringNode)):
+                continue
+            statements.append(element)
+        node.element_nodes = statements
+        return node
+
+
+class LoopOptimizer:
+    BUILTINS = ('print', 'get', 'run', 'SQRT', 'nombreAleatoire', 'size', 'create_array', 'create_map') + BuiltInFunction.LIBRARY
+    # Same arguments, same result, no effects: safe to evaluate once per loop
+    PURE_BUILTINS = ('SQRT', 'size')
+    # Builtins that never write through their arguments
+    READ_ONLY_BUILTINS = ('print', 'run', 'SQRT', 'nombreAleatoire', 'size', 'create_array', 'create_map',
+                          'search', 'sum', 'min', 'max', 'copy')
+    WORTH_HOISTING = (BinOpNode, UnaryOpNode, CallNode, IndexAccessNode, InductionNode)
+
+    def __init__(self, types):
+        self.types = types
+        self.slots = 0
+        self.parameters = set()
+        self.functions = set()
+
+    def optimize(self, nodes):
+        # User functions may reuse the name of a library builtin
+        self.functions = {node.var_name_tok.value for node in nodes if isinstance(node, FunctionDefNode)}
+        return [self.visit(node) for node in nodes]
+
+    def new_slot(self):
+        self.slots += 1
+        return self.slots
+
+    ######################################
+
+    def visit(self, node):
+        if isinstance(node, FunctionDefNode):
+            outer = self.types, self.parameters
+            self.types = {**self.types, **node.local_types}
+            self.parameters = {tok.value for tok in node.arg_name_toks}
+            node.body_node = self.visit(node.body_node)
+            self.types, self.parameters = outer
+            return node
+        if isinstance(node, (ForNode, WhileNode)):
+            return self.visit_loop(node)
+        return self.map_children(node, self.visit)
+
+    def map_children(self, node, function):
+        for name, value in node.__dict__.items():
+            if isinstance(value, Node):
+                setattr(node, name, function(value))
+            elif isinstance(value, (list, tuple)):
+                setattr(node, name, self.map_sequence(value, function))
+        return node
+
+    def map_sequence(self, items, function):
+        mapped = [
+            function(item) if isinstance(item, Node)
+            else self.map_sequence(item, function) if isinstance(item, (list, tuple))
+            else item
+            for item in items
+        ]
+        return tuple(mapped) if isinstance(items, tuple) else mapped
+
+    def visit_loop(self, loop):
+        effects = self.effects(loop)
+        slots = []
+        if effects is not None:
+            modified, array_writes = effects
+            induction = None
+            if isinstance(loop, ForNode) and loop.var_name_tok.value in self.int_names() and not self.assigns(loop.body_node, loop.var_name_tok.value):
+                induction = loop.var_name_tok.value
+            rewrite = lambda node: self.rewrite(node, modified, array_writes, induction, slots)
+            loop.body_node = rewrite(loop.body_node)
+            if isinstance(loop, WhileNode):
+                loop.condition_node = rewrite(loop.condition_node)
+
+        # Inner loops get their own pass over what is left
+        loop.body_node = self.visit(loop.body_node)
+        if slots:
+            return LoopScopeNode(loop, slots)
+        return loop
+
+    ######################################
+
+    def effects(self, loop):
+        # Names the loop may rebind and whether it writes into arrays;
+        # None when it calls user code, which could change anything
+        modified = set()
+        array_writes = False
+        stack = [loop]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, (list, tuple)):
+                stack.extend(item)
+                continue
+            if not isinstance(item, Node):
+                continue
+            if isinstance(item, VarAssignNode):
+                modified.add(item.var_name_tok.value)
+            elif isinstance(item, (ForNode, ForEachNode)):
+                modified.add(item.var_name_tok.value)
+            elif isinstance(item, IndexAssignNode):
+                array_writes = True
+                base = item.target_node.target_node
+                if isinstance(base, VarAccessNode):
+                    modified.add(base.var_name_tok.value)
+            elif isinstance(item, CallNode):
+                callee = item.node_to_call
+                name = callee.var_name_tok.value if isinstance(callee, VarAccessNode) else None
+                if name not in self.BUILTINS or name in self.functions:
+                    return None
+                if name not in self.READ_ONLY_BUILTINS:
+                    array_writes = True
+                    for arg in item.arg_nodes:
+                        if isinstance(arg, Token):
+                            modified.add(arg.value)
+                        elif isinstance(arg, VarAccessNode):
+                            modified.add(arg.var_name_tok.value)
+                for arg in item.arg_nodes:
+                    if isinstance(arg, Token) and arg.type == TT_IDENTIFIER:
+                        modified.add(arg.value)
+            stack.extend(item.__dict__.values())
+        return modified, array_writes
+
+    def assigns(self, node, name):
+        effects = self.effects(node)
+        return effects is None or name in effects[0]
+
+    def int_names(self):
+        return {name for name, var_type in self.types.items() if var_type == 'int' and name not in self.parameters}
+
+    def invariant(self, node, modified, array_writes):
+        if isinstance(node, (NumberNode, StringNode, HoistedNode)):
+            return True
+        if isinstance(node, VarAccessNode):
+            return node.var_name_tok.value not in modified
+        if isinstance(node, BinOpNode):
+            return self.invariant(node.left_node, modified, array_writes) and self.invariant(node.right_node, modified, array_writes)
+        if isinstance(node, UnaryOpNode):
+            return self.invariant(node.node, modified, array_writes)
+        if isinstance(node, InductionNode):
+            return node.var_name not in modified and self.invariant(node.factor_node, modified, array_writes)
+        if isinstance(node, IndexAccessNode):
+            return (not array_writes and self.invariant(node.target_node, modified, array_writes)
+                    and all(self.invariant(index, modified, array_writes) for index in node.index_nodes))
+        if isinstance(node, CallNode):
+            callee = node.node_to_call
+            if not isinstance(callee, VarAccessNode) or callee.var_name_tok.value not in self.PURE_BUILTINS:
+                return False
+            return all(
+                arg.value not in modified if isinstance(arg, Token) else self.invariant(arg, modified, array_writes)
+                for arg in node.arg_nodes
+            )
+        return False
+
+    def induction(self, node, var_name, modified, array_writes):
+        # var * k or k * var, with k an int literal or an int variable the loop leaves alone
+        if not isinstance(node, BinOpNode) or node.op_tok.type != TT_MULT:
+            return None
+        for var_node, factor in ((node.left_node, node.right_node), (node.right_node, node.left_node)):
+            if not isinstance(var_node, VarAccessNode) or var_node.var_name_tok.value != var_name:
+                continue
+            if isinstance(factor, NumberNode) and type(factor.tok.value) is int:
+                return InductionNode(var_name, factor, node, self.new_slot())
+            if isinstance(factor, VarAccessNode) and factor.var_name_tok.value in self.int_names() \
+                    and self.invariant(factor, modified, array_writes):
+                return InductionNode(var_name, factor, node, self.new_slot())
+        return None
+
+    def rewrite(self, node, modified, array_writes, induction, slots):
+        if isinstance(node, (FunctionDefNode, HoistedNode, LoopScopeNode)):
+            return node
+        if induction:
+            reduced = self.induction(node, induction, modified, array_writes)
+            if reduced:
+                slots.append(reduced.slot)
+                node = reduced
+        if isinstance(node, self.WORTH_HOISTING) and self.invariant(node, modified, array_writes):
+            hoisted = HoistedNode(node, self.new_slot())
+            slots.append(hoisted.slot)
+            return hoisted
+        if isinstance(node, InductionNode):
+            return node
+
+        rewrite = lambda child: self.rewrite(child, modified, array_writes, induction, slots)
+        if isinstance(node, IndexAssignNode):
+            # The target is written through, never evaluated as a value
+            node.target_node.index_nodes = [rewrite(index) for index in node.target_node.index_nodes]
+            node.value_node = rewrite(node.value_node)
+            return node
+        if isinstance(node, CallNode):
+            node.arg_nodes = [rewrite(arg) if isinstance(arg, Node) else arg for arg in node.arg_nodes]
+            return node
+        return self.map_children(node, rewrite)
+
+
+class TailCallOptimizer:
+    # Every return is in tail position. One that returns a direct call to
+    # the enclosing function becomes a TailCallNode, which reruns the body
+    # in the caller's frame instead of nesting a new call.
+    def optimize(self, nodes):
+        for node in nodes:
+            if isinstance(node, FunctionDefNode) and node.var_name_tok:
+                name = node.var_name_tok.value
+                # A local of the same name hides the function
+                if name not in node.local_types:
+                    node.body_node = self.visit(node.body_node, name)
+        return nodes
+
+    def visit(self, node, name):
+        if isinstance(node, ReturnNode):
+            call = node.node_to_return
+            if isinstance(call, CallNode) and isinstance(call.node_to_call, VarAccessNode) \
+                    and call.node_to_call.var_name_tok.value == name:
+                return TailCallNode(node)
+            return node
+        if isinstance(node, ListNode):
+            node.element_nodes = [self.visit(element, name) for element in node.element_nodes]
+        elif isinstance(node, IfNode):
+            node.cases = [(condition, self.visit(expr, name), should_return_null) for condition, expr, should_return_null in node.cases]
+            if node.else_case:
+                node.else_case = (self.visit(node.else_case[0], name), node.else_case[1])
+        elif isinstance(node, (ForNode, ForEachNode, WhileNode)):
+            node.body_node = self.visit(node.body_node, name)
+        elif isinstance(node, LoopScopeNode):
+            node.loop_node = self.visit(node.loop_node, name)
+        return node
+
+
+class PurityAnalysis:
+    # Marks functions whose result depends on their arguments alone: no
+    # print or get, no array writes, no global read or written, and only
+    # pure functions called. Their calls may be memoized.
+    SCALAR_TYPES = ('int', 'float', 'str', 'bool')
+
+    def analyze(self, nodes):
+        functions = {node.var_name_tok.value: node for node in nodes
+                     if isinstance(node, FunctionDefNode) and node.var_name_tok}
+        pure = {}
+        for name, node in functions.items():
+            callees = self.callees(node, functions)
+            if callees is not None:
+                pure[name] = callees
+
+        # A function calling an impure one is impure too
+        changed = True
+        while changed:
+            changed = False
+            for name, callees in list(pure.items()):
+                if not callees <= pure.keys():
+                    del pure[name]
+                    changed = True
+
+        for name, node in functions.items():
+            node.pure = name in pure
+        return nodes
+
+    def callees(self, function, functions):
+        # The user functions this one calls; None when it has effects of its own
+        if function.return_type not in self.SCALAR_TYPES:
+            return None
+        local = function.local_types
+        callees = set()
+        stack = [function.body_node]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, (list, tuple)):
+                stack.extend(item)
+                continue
+            if not isinstance(item, Node):
+                continue
+            if isinstance(item, IndexAssignNode):
+                return None
+            if isinstance(item, VarAccessNode):
+                name = item.var_name_tok.value
+                if name not in local and name not in functions and name not in Optimizer.CONSTANT_NAMES:
+                    return None
+                continue
+            elif isinstance(item, (VarAssignNode, ForNode, ForEachNode)):
+                if item.var_name_tok.value not in local:
+                    return None
+            elif isinstance(item, CallNode):
+                callee = item.node_to_call
+                name = callee.var_name_tok.value if isinstance(callee, VarAccessNode) else None
+                if name in functions and name not in local:
+                    callees.add(name)
+                elif name not in LoopOptimizer.PURE_BUILTINS:
+                    return None
+                stack.extend(arg for arg in item.arg_nodes if isinstance(arg, Node))
+                continue
+            stack.extend(item.__dict__.values())
+        return callees
+
+
+######################################
+# COVERAGE
+######################################
+
+class Coverage:
+    def __init__(self, program):
+        self.program = program
+        self.lines = []
+        nodes = [self.instrument(node) for node in program.nodes]
+        self.instrumented = copy.copy(program)
+        self.instrumented.nodes = nodes
+
+    def instrument(self, node):
+        # Copy the tree, wrapping every statement of a block and every
+        # branch body of an if in a probe; the compiled program is untouched.
+        if isinstance(node, list):
+            return [self.instrument(item) for item in node]
+        if isinstance(node, tuple):
+            return tuple(self.instrument(item) for item in node)
+        if not isinstance(node, Node):
+            return node
+
+        clone = copy.copy(node)
+        for name, value in node.__dict__.items():
+            if isinstance(value, (Node, list, tuple)):
+                setattr(clone, name, self.instrument(value))
+
+        if isinstance(clone, ListNode):
+            clone.element_nodes = [self.probe(element) for element in clone.element_nodes]
+        elif isinstance(clone, IfNode):
+            clone.cases = [(condition, self.probe(expr), should_return_null) for condition, expr, should_return_null in clone.cases]
+            if clone.else_case:
+                clone.else_case = (self.probe(clone.else_case[0]), clone.else_case[1])
+        return clone
+
+    def probe(self, node):
+        if isinstance(node, (ListNode, StatementProbe)) or not node.pos_start:
+            return node
+        self.lines.append(node.pos_start.ln)
+        return StatementProbe(node, len(self.lines) - 1)
+
+    @property
+    def statement_count(self):
+        return len(self.lines)
+
+    def new_hits(self):
+        return bytearray(len(self.lines))
+
+    BITS = bytes.maketrans(b'\x00\x01', b'01')
+
+    @classmethod
+    def bitmap(cls, hits):
+        # One byte per statement while running, packed to one bit per statement (bit i = statement i)
+        return int(bytes(reversed(hits)).translate(cls.BITS) or b'0', 2)
+
+    @staticmethod
+    def merge(bitmaps):
+        merged = 0
+        for bitmap in bitmaps:
+            merged |= bitmap
+        return merged
+
+    @staticmethod
+    def to_hex(bitmap):
+        return format(bitmap, 'x')
+
+    @staticmethod
+    def from_hex(text):
+        return int(text, 16) if text else 0
+
+    def covered_statements(self, bitmap):
+        return [index for index in range(len(self.lines)) if bitmap >> index & 1]
+
+    def line_status(self, bitmap):
+        # line -> [statements hit, statements on the line]
+        status = {}
+        for index, ln in enumerate(self.lines):
+            counts = status.setdefault(ln, [0, 0])
+            counts[0] += bitmap >> index & 1
+            counts[1] += 1
+        return status
+
+    def percent(self, bitmap):
+        if not self.lines:
+            return 100.0
+        return 100.0 * bin(bitmap).count('1') / len(self.lines)
+
+    def minimal_runs(self, bitmaps):
+        # Greedy set cover: runs that reach the merged coverage with no
+        # run adding nothing new
+        remaining = self.merge(bitmaps)
+        chosen = []
+        while remaining:
+            best = max(range(len(bitmaps)), key=lambda i: bin(bitmaps[i] & remaining).count('1'))
+            if not bitmaps[best] & remaining:
+                break
+            chosen.append(best)
+            remaining &= ~bitmaps[best]
+        return sorted(chosen)
+
+    def report(self, bitmap):
+        status = self.line_status(bitmap)
+        covered = bin(bitmap).count('1')
+        lines = [f"{self.program.fn}: {covered}/{len(self.lines)} statements covered ({self.percent(bitmap):.1f}%)", ""]
+        for ln, text in enumerate(self.program.text.rstrip('\n').split('\n')):
+            hit, total = status.get(ln, (0, 0))
+            marker = '  ' if not total else '> ' if hit == total else '~ ' if hit else '! '
+            lines.append(f"{marker}{ln + 1:>5} | {text}")
+        return "\n".join(lines)
+
+
+######################################
+# PROFILER
+######################################
+
+class Profiler:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.lines = {}
+        self.node_types = {}
+        self.text = None
+        self.fn = None
+        self.total_time = 0.0
+        self.child_times = []
+        self.current_line = None
+        self.statements = set()
+
+    def install(self, interpreter):
+        visit = interpreter.visit
+        clock = self.clock
+        lines = self.lines
+        node_types = self.node_types
+        child_times = self.child_times
+        statements = self.statements
+
+        async def profiled_visit(node, context):
+            parent_line = self.current_line
+            # A statement list spans many lines; its own overhead belongs to the line that owns it
+            ln = parent_line if isinstance(node, ListNode) or not node.pos_start else node.pos_start.ln
+            new_line = ln != parent_line
+            if new_line:
+                self.current_line = ln
+
+            child_times.append(0.0)
+            start = clock()
+            try:
+                return await visit(node, context)
+            finally:
+                elapsed = clock() - start
+                self_time = elapsed - child_times.pop()
+                if child_times:
+                    child_times[-1] += elapsed
+
+                stats = node_types.get(type(node).__name__)
+                if stats is None:
+                    stats = node_types[type(node).__name__] = [0, 0.0, 0.0]
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] += self_time
+
+                stats = lines.get(ln)
+                if stats is None:
+                    stats = lines[ln] = [0, 0.0, 0.0]
+                stats[2] += self_time
+                # Every statement run is a hit, even when a call body runs on the caller's line;
+                # inclusive time is only charged once per line so recursion is not counted twice
+                if id(node) in statements:
+                    stats[0] += 1
+                if new_line:
+                    stats[1] += elapsed
+                    self.current_line = parent_line
+
+        interpreter.visit = profiled_visit
+        return interpreter
+
+    def start(self, program, session=None):
+        self.fn = program.fn
+        self.text = program.text
+        self.current_line = None
+        self.statements.update(map(id, self.statement_nodes(program.nodes)))
+        self.run_start = self.clock()
+
+    @staticmethod
+    def statement_nodes(nodes):
+        # The statements of every block and the branch bodies of every if
+        stack = list(nodes)
+        found = [node for node in nodes if isinstance(node, Node) and not isinstance(node, ListNode)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, (list, tuple)):
+                stack.extend(item)
+                continue
+            if not isinstance(item, Node):
+                continue
+            stack.extend(item.__dict__.values())
+            if isinstance(item, ListNode):
+                found.extend(item.element_nodes)
+            elif isinstance(item, IfNode):
+                # A body written on the if's own line is part of that statement
+                bodies = [expr for _, expr, _ in item.cases]
+                if item.else_case:
+                    bodies.append(item.else_case[0])
+                found.extend(body for body in bodies if body.pos_start and body.pos_start.ln != item.pos_start.ln)
+        return [node for node in found if not isinstance(node, ListNode)]
+
+    def stop(self):
+        self.total_time += self.clock() - self.run_start
+
+    def source_line(self, ln):
+        if self.text is None or ln is None:
+            return ''
+        lines = self.text.split('\n')
+        return lines[ln].strip() if 0 <= ln < len(lines) else ''
+
+    def as_dict(self):
+        return {
+            "file": self.fn,
+            "total_time": self.total_time,
+            "lines": [
+                {"line": ln + 1, "hits": hits, "total_time": total, "self_time": own, "source": self.source_line(ln)}
+                for ln, (hits, total, own) in sorted(self.lines.items(), key=lambda item: -item[1][2])
+                if ln is not None
+            ],
+            "node_types": [
+                {"node_type": name, "hits": hits, "total_time": total, "self_time": own}
+                for name, (hits, total, own) in sorted(self.node_types.items(), key=lambda item: -item[1][2])
+            ],
+        }
+
+    def as_json(self, indent=2):
+        import json
+        return json.dumps(self.as_dict(), indent=indent)
+
+    def report(self, limit=20):
+        data = self.as_dict()
+        result = f"Profile of {data['file']}: {data['total_time']:.6f} s\n\n"
+        result += f"{'Line':>6} {'Hits':>10} {'Total (s)':>12} {'Self (s)':>12}  Source\n"
+        for entry in data["lines"][:limit]:
+            result += f"{entry['line']:>6} {entry['hits']:>10} {entry['total_time']:>12.6f} {entry['self_time']:>12.6f}  {entry['source']}\n"
+        result += f"\n{'Node type':<18} {'Hits':>10} {'Total (s)':>12} {'Self (s)':>12}\n"
+        for entry in data["node_types"]:
+            result += f"{entry['node_type']:<18} {entry['hits']:>10} {entry['total_time']:>12.6f} {entry['self_time']:>12.6f}\n"
+        return result
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.001, mode='auto', clock=time.perf_counter):
+        self.interval = interval
+        self.mode = mode
+        self.clock = clock
+        self.stacks = {}
+        self.samples = 0
+        self.sample_time = 0.0
+        self.total_time = 0.0
+        self.fn = None
+        self.thread = None
+        self.running = False
+        self.timer_session = None
+
+    def install(self, interpreter):
+        return interpreter
+
+    def start(self, program, session=None):
+        import sys
+        self.fn = program.fn
+        self.running = True
+        self.run_start = self.clock()
+
+        mode = self.mode
+        if mode == 'auto':
+            mode = 'timer' if sys.platform == 'emscripten' else 'thread'
+        if mode == 'thread':
+            try:
+                import threading
+                self.target = threading.get_ident()
+                self.thread = threading.Thread(target=self.sample_loop, name='daups-sampler', daemon=True)
+                self.thread.start()
+            except Exception:
+                self.thread = None
+                mode = 'timer'
+        if mode == 'timer' and session is not None:
+            self.install_timer(session)
+        self.active_mode = mode
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.timer_session is not None:
+            self.uninstall_timer()
+        self.total_time += self.clock() - self.run_start
+
+    def sample_loop(self):
+        import sys
+        while self.running:
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self.target)
+            if frame is not None:
+                self.sample(frame)
+
+    def install_timer(self, session):
+        # Without threads (Pyodide) the session's own step counter drives the sampling
+        import sys
+        step = session.step
+        clock = self.clock
+        next_sample = [clock() + self.interval]
+
+        def sampled_step():
+            if clock() >= next_sample[0]:
+                self.sample(sys._getframe(1))
+                next_sample[0] = clock() + self.interval
+            return step()
+
+        # The session may run again after this profiler stops, so remember
+        # whatever step it had (normally the class method) to put it back
+        self.timer_session, self.saved_step = session, session.__dict__.get('step')
+        session.step = sampled_step
+
+    def uninstall_timer(self):
+        session, self.timer_session = self.timer_session, None
+        if self.saved_step is None:
+            del session.step
+        else:
+            session.step = self.saved_step
+
+    def sample(self, frame):
+        start = self.clock()
+        node = context = None
+        while frame is not None:
+            if frame.f_code.co_name.startswith('visit_'):
+                f_locals = frame.f_locals
+                node = f_locals.get('node')
+                context = f_locals.get('context')
+                if isinstance(node, Node) and isinstance(context, Context):
+                    break
+            frame = frame.f_back
+        else:
+            node = context = None
+
+        if context is not None:
+            stack = self.collapse(node, context)
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.samples += 1
+        self.sample_time += self.clock() - start
+
+    def collapse(self, node, context):
+        frames = []
+        pos = node.pos_start
+        while context:
+            frames.append(f"{context.display_name}:{pos.ln + 1}" if pos else context.display_name)
+            pos = context.parent_entry_pos or pos
+            context = context.parent
+        return ';'.join(reversed(frames))
+
+    def overhead(self):
+        return self.sample_time / self.total_time if self.total_time else 0.0
+
+    def as_collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def report(self, limit=20):
+        result = f"Sampling profile of {self.fn}: {self.samples} samples every {self.interval * 1000:.3f} ms ({self.active_mode} mode)\n"
+        result += f"Sampling overhead: {self.sample_time:.6f} s of {self.total_time:.6f} s ({self.overhead() * 100:.2f}%)\n\n"
+        for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1])[:limit]:
+            share = count / self.samples * 100 if self.samples else 0.0
+            result += f"{count:>8} {share:>6.2f}%  {stack}\n"
+        return result
+
+
+class MemoryProfiler(TraceHook):
+    def __init__(self):
+        self.lines = {}
+        self.kinds = {}
+        self.stack = []
+        self.text = None
+        self.fn = None
+        self.peak = 0
+        self.peak_line = None
+        self.retained = 0
+
+    def start(self, program, session=None):
+        import tracemalloc
+        self.tracemalloc = tracemalloc
+        self.fn = program.fn
+        self.text = program.text
+        self.stack = []
+        self.was_tracing = tracemalloc.is_tracing()
+        if not self.was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        self.peak_seen = self.baseline
+
+    def stop(self):
+        current, peak = self.tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak - self.baseline)
+        self.retained = current - self.baseline
+        if not self.was_tracing:
+            self.tracemalloc.stop()
+        self.stack = []
+
+    def on_node_enter(self, node, context):
+        parent_line = self.stack[-1][0] if self.stack else None
+        # Like the time profiler, a statement list's own allocations belong to the line that owns it
+        ln = parent_line if isinstance(node, ListNode) or not node.pos_start else node.pos_start.ln
+        self.stack.append([ln, self.tracemalloc.get_traced_memory()[0], 0])
+
+    def on_node_exit(self, node, context, result):
+        if not self.stack:
+            return
+        ln, start, children = self.stack.pop()
+        current, peak = self.tracemalloc.get_traced_memory()
+        growth = current - start
+        own = growth - children
+        if self.stack:
+            self.stack[-1][2] += growth
+        if peak > self.peak_seen:
+            self.peak_seen = peak
+            self.peak_line = ln
+
+        # [hits, bytes allocated, net bytes]: frees land wherever the last
+        # reference dies, so growth is what points at the culprit
+        stats = self.lines.get(ln)
+        if stats is None:
+            stats = self.lines[ln] = [0, 0, 0]
+        stats[0] += 1
+        stats[2] += own
+        if own <= 0:
+            return
+        stats[1] += own
+
+        value = result.value if result is not None else None
+        if value is not None:
+            kind = type(value).__name__
+            self.kinds[kind] = self.kinds.get(kind, 0) + own
+
+    def source_line(self, ln):
+        if self.text is None or ln is None:
+            return ''
+        lines = self.text.split('\n')
+        return lines[ln].strip() if 0 <= ln < len(lines) else ''
+
+    def as_dict(self):
+        return {
+            "file": self.fn,
+            "peak": self.peak,
+            "peak_line": self.peak_line + 1 if self.peak_line is not None else None,
+            "retained": self.retained,
+            "lines": [
+                {"line": ln + 1, "hits": hits, "allocated": allocated, "net": net, "source": self.source_line(ln)}
+                for ln, (hits, allocated, net) in sorted(self.lines.items(), key=lambda item: -item[1][1])
+                if ln is not None
+            ],
+            "kinds": dict(sorted(self.kinds.items(), key=lambda item: -item[1])),
+        }
+
+    def report(self, limit=10):
+        peak_line = f" (reached on line {self.peak_line + 1})" if self.peak_line is not None else ""
+        result = f"Memory of {self.fn}: peak {self.peak / 1024:.1f} KiB{peak_line}, retained {self.retained / 1024:.1f} KiB\n\n"
+        result += f"{'Line':>6} {'Hits':>10} {'Alloc KiB':>12} {'Net KiB':>12}  Source\n"
+        top = sorted(((ln, stats) for ln, stats in self.lines.items() if ln is not None), key=lambda item: -item[1][1])
+        for ln, (hits, allocated, net) in top[:limit]:
+            result += f"{ln + 1:>6} {hits:>10} {allocated / 1024:>12.1f} {net / 1024:>12.1f}  {self.source_line(ln)}\n"
+        result += f"\n{'Kind':<20} {'Alloc KiB':>12}\n"
+        for kind, size in sorted(self.kinds.items(), key=lambda item: -item[1]):
+            result += f"{kind:<20} {size / 1024:>12.1f}\n"
+        return result
+
 
 ######################################
 # RUN
 ######################################
 
-def reset_global_symbol_table():
-    global global_symbol_table
-    global_symbol_table = SymbolTable()
-    global_symbol_table.set("NULL", Number.null)
-    global_symbol_table.set("false", Number.false)
-    global_symbol_table.set("true", Number.true)
-    global_symbol_table.set("create_array", BuiltInFunction('create_array'))
-    global_symbol_table.set("print", BuiltInFunction.print)
-    global_symbol_table.set("get", BuiltInFunction.get)
-    global_symbol_table.set("run", BuiltInFunction.run)
-    global_symbol_table.set("SQRT", BuiltInFunction.SQRT)
-    global_symbol_table.set("nombreAleatoire", BuiltInFunction.nombreAleatoire)
-    global_symbol_table.set("size", BuiltInFunction.size)
-    global_symbol_table.set("Pi", Number(3.141592653589793))
+def make_global_symbol_table():
+    symbol_table = SymbolTable()
+    symbol_table.set("NULL", Number.null)
+    symbol_table.set("false", Number.false)
+    symbol_table.set("true", Number.true)
+    symbol_table.set("create_array", BuiltInFunction('create_array'))
+    symbol_table.set("create_map", BuiltInFunction.create_map)
+    symbol_table.set("print", BuiltInFunction.print)
+    symbol_table.set("get", BuiltInFunction.get)
+    symbol_table.set("run", BuiltInFunction.run)
+    symbol_table.set("SQRT", BuiltInFunction.SQRT)
+    symbol_table.set("nombreAleatoire", BuiltInFunction.nombreAleatoire)
+    symbol_table.set("size", BuiltInFunction.size)
+    for name, function in BuiltInFunction.library.items():
+        symbol_table.set(name, function)
+    symbol_table.set("Pi", Number(3.141592653589793))
+    return symbol_table
 
 def check_stop():
     try:
@@ -2381,48 +4201,436 @@ def check_stop():
     except Exception:
         pass
 
+async def default_read_input():
+    if '__js_get_input' in globals() and globals()['__js_get_input'] is not None:
+        val = globals()['__js_get_input']()
+        if val is not None:
+            return str(val)
+    return await web_await_input()
 
-async def run_async(fn, text):
-    reset_global_symbol_table()
-    text += "\n"
 
-    try:
-        globals()["__stop_requested"] = False
-    except Exception:
-        pass
+######################################
+# SESSION
+######################################
+
+class LimitExceeded(Exception):
+    def __init__(self, error_class, details):
+        super().__init__(details)
+        self.error_class = error_class
+        self.details = details
+
+    def as_error(self, node, context):
+        return self.error_class(node.pos_start, node.pos_end, self.details, context)
+
+class RunLimits:
+    # max_array_elements is a budget for the whole run: every element made by
+    # create_array, copy, append or insert counts against it and only pop gives
+    # one back, since arrays share storage and a replaced one may still be alive
+    MAX_CALL_DEPTH = 20000
+
+    def __init__(self, max_steps=None, timeout=None, max_array_elements=None, max_output_bytes=None, max_call_depth=MAX_CALL_DEPTH):
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_array_elements = max_array_elements
+        self.max_output_bytes = max_output_bytes
+        self.max_call_depth = max_call_depth
+
+RunLimits.none = RunLimits()
+
+class RunMetrics:
+    FIELDS = ('lex_time', 'parse_time', 'execute_time', 'tokens', 'nodes', 'nodes_evaluated',
+              'function_calls', 'max_call_depth', 'output_bytes', 'get_calls', 'peak_memory',
+              'memo_hits', 'memo_misses')
+
+    def __init__(self, lex_time=0.0, parse_time=0.0, tokens=0, nodes=0):
+        self.lex_time = lex_time
+        self.parse_time = parse_time
+        self.execute_time = 0.0
+        self.tokens = tokens
+        self.nodes = nodes
+        self.nodes_evaluated = 0
+        self.function_calls = 0
+        self.max_call_depth = 0
+        self.output_bytes = 0
+        self.get_calls = 0
+        self.peak_memory = None
+        self.memo_hits = None
+        self.memo_misses = None
+
+    @property
+    def total_time(self):
+        return self.lex_time + self.parse_time + self.execute_time
+
+    @property
+    def memo_hit_rate(self):
+        lookups = (self.memo_hits or 0) + (self.memo_misses or 0)
+        return self.memo_hits / lookups if lookups else 0.0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def summary(self):
+        return (f"lex {self.lex_time * 1000:.1f} ms, parse {self.parse_time * 1000:.1f} ms, "
+                f"run {self.execute_time * 1000:.1f} ms | {self.tokens} tokens, {self.nodes} nodes, "
+                f"{self.nodes_evaluated} evaluated | {self.function_calls} calls (depth {self.max_call_depth}) | "
+                f"{self.output_bytes} B printed, {self.get_calls} get"
+                + (f" | peak {self.peak_memory / 1024:.1f} KiB" if self.peak_memory is not None else "")
+                + (f" | memo {self.memo_hit_rate * 100:.1f}% of {self.memo_hits + self.memo_misses} pure calls" if self.memo_hits is not None else ""))
+
+    def __repr__(self):
+        return f"<RunMetrics {self.summary()}>"
+
+class MemoCache:
+    # Results of pure function calls keyed by the function and its scalar
+    # arguments, evicting the least recently used entry past `size`
+    SIZE = 4096
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, function, args):
+        key = [function.body_node]
+        for arg in args:
+            if not isinstance(arg, (Number, String)):
+                return None
+            # 1, 1.0 and True compare equal but do not divide alike
+            key.append(type(arg.value))
+            key.append(arg.value)
+        return tuple(key)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+class InterpreterSession:
+    CHECK_INTERVAL = 1024
+
+    def __init__(self, write=None, read_input=None, watch_global_stop=False, parent=None,
+                 slice_steps=None, limits=None, profiler=None, hooks=None, coverage=None, memory=None, stackless=True,
+                 memoize=None, drain=None, allow_run=True):
+        self.global_symbol_table = make_global_symbol_table()
+        self.frames = FramePool()
+        self.stop_requested = False
+        self.write = write or web_write
+        self.input_source = read_input or default_read_input
+        self.drain = drain
+        self.allow_run = allow_run
+        self.watch_global_stop = watch_global_stop
+        self.parent = parent
+        self.slice_steps = slice_steps
+        self.limits = limits or RunLimits.none
+        self.profiler = profiler
+        self.hooks = list(hooks or [])
+        self.coverage = coverage
+        self.memory = memory
+        self.stackless = stackless
+        self.memoize = memoize
+        self.memo = None
+        self.coverage_hits = None
+        self.coverage_bitmap = None
+        self.steps = 0
+        self.next_checkpoint = 0
+        self.deadline = None
+        self.array_elements = 0
+        self.output_bytes = 0
+        self.function_calls = 0
+        self.call_depth = 0
+        self.max_call_depth = 0
+        self.get_calls = 0
+        self.metrics = None
+
+    @classmethod
+    def from_inputs(cls, inputs, write=None, **kwargs):
+        feed = iter(inputs)
+        return cls(write=write, read_input=lambda: next(feed, ""), **kwargs)
+
+    def spawn(self):
+        # A script started with 'run' shares its parent's limits: its steps, arrays
+        # and output (written through the parent) are charged to the parent's run
+        return InterpreterSession(self.output, self.input_source, parent=self, slice_steps=self.slice_steps, limits=self.limits,
+                                  stackless=self.stackless, drain=self.drain, allow_run=self.allow_run)
+
+    def request_stop(self):
+        self.stop_requested = True
+
+    def check_stop(self):
+        if self.stop_requested:
+            raise KeyboardInterrupt("Execution stopped by user")
+        if self.watch_global_stop:
+            check_stop()
+        if self.parent:
+            self.parent.check_stop()
+
+    def step(self):
+        self.steps += 1
+        if self.parent:
+            return self.parent.step()
+        self.check_stop()
+        if self.steps >= self.next_checkpoint:
+            return self.checkpoint()
+        return False
+
+    def checkpoint(self):
+        max_steps = self.limits.max_steps
+        if max_steps is not None and self.steps > max_steps:
+            raise LimitExceeded(StepLimitError, f"Program exceeded {max_steps} steps")
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise LimitExceeded(TimeLimitError, f"Program ran longer than {self.limits.timeout} s")
+
+        interval = self.slice_steps or self.CHECK_INTERVAL
+        self.next_checkpoint = self.steps + interval
+        if max_steps is not None:
+            self.next_checkpoint = min(self.next_checkpoint, max_steps + 1)
+        return self.slice_steps is not None
+
+    def enter_call(self):
+        max_depth = self.limits.max_call_depth
+        if max_depth is not None and self.call_depth >= max_depth:
+            raise LimitExceeded(RecursionLimitError, f"Program nested more than {max_depth} function calls")
+        self.function_calls += 1
+        self.call_depth += 1
+        if self.call_depth > self.max_call_depth:
+            self.max_call_depth = self.call_depth
+
+    def allocate(self, elements):
+        if self.parent:
+            self.parent.allocate(elements)
+        self.array_elements += elements
+        max_elements = self.limits.max_array_elements
+        if max_elements is not None and self.array_elements > max_elements:
+            raise LimitExceeded(MemoryLimitError, f"Program created more than {max_elements} array elements")
+
+    def release(self, elements):
+        if self.parent:
+            self.parent.release(elements)
+        self.array_elements -= elements
+
+    def output(self, s):
+        self.output_bytes += len(s.encode('utf-8'))
+        max_bytes = self.limits.max_output_bytes
+        if max_bytes is not None and self.output_bytes > max_bytes:
+            raise LimitExceeded(OutputLimitError, f"Program printed more than {max_bytes} bytes")
+        self.write(s)
+
+    async def read_input(self):
+        self.get_calls += 1
+        text = await self.suspend(maybe_await(self.input_source()))
+        return "" if text is None else str(text)
+
+    async def suspend(self, awaitable):
+        # Time spent waiting on other sessions' slices, on input or on a slow
+        # reader is not charged against the run's timeout
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            waited = time.perf_counter() - start
+            session = self
+            while session:
+                if session.deadline is not None:
+                    session.deadline += waited
+                session = session.parent
+
+    def pause(self):
+        return self.suspend(asyncio.sleep(0))
+
+    def flush(self):
+        # drain() lets the consumer of the output hold the program back until it catches up
+        return self.suspend(maybe_await(self.drain()) if self.drain else asyncio.sleep(0))
+
+    def install_declarations(self, declarations):
+        for var_name, var_type in declarations.items():
+            self.global_symbol_table.set(var_name, None, var_type)
+
+    async def run_program(self, program):
+        self.install_declarations(program.declarations)
+        self.steps = 0
+        self.next_checkpoint = 0
+        self.array_elements = 0
+        self.output_bytes = 0
+        self.function_calls = 0
+        self.call_depth = 0
+        self.max_call_depth = 0
+        self.get_calls = 0
+        # Results are only reused within one run
+        self.memo = MemoCache(self.memoize) if self.memoize else None
+        if self.limits.timeout is not None:
+            self.deadline = time.perf_counter() + self.limits.timeout
+
+        self.coverage_hits = None
+        if self.coverage and self.coverage.program is program:
+            self.coverage_hits = self.coverage.new_hits()
+            program = self.coverage.instrumented
+        hooks = self.hooks + [self.memory] if self.memory else self.hooks
+        interpreter = Interpreter(hooks, session=self, stackless=self.stackless)
+        if self.profiler:
+            self.profiler.install(interpreter)
+            self.profiler.start(program, self)
+        if self.memory:
+            self.memory.start(program, self)
+
+        context = Context('<program>', session=self)
+        context.symbol_table = self.global_symbol_table
+        start = time.perf_counter()
+        try:
+            return await self.execute(program, interpreter, context)
+        finally:
+            if self.memory:
+                self.memory.stop()
+            if self.profiler:
+                self.profiler.stop()
+            if self.coverage_hits is not None:
+                self.coverage_bitmap = self.coverage.bitmap(self.coverage_hits)
+            self.metrics = self.collect_metrics(program, interpreter, time.perf_counter() - start)
+
+    def collect_metrics(self, program, interpreter, execute_time):
+        metrics = RunMetrics(program.lex_time, program.parse_time, program.token_count, program.node_count)
+        metrics.execute_time = execute_time
+        metrics.nodes_evaluated = interpreter.nodes_evaluated
+        metrics.function_calls = self.function_calls
+        metrics.max_call_depth = self.max_call_depth
+        metrics.output_bytes = self.output_bytes
+        metrics.get_calls = self.get_calls
+        if self.memory:
+            metrics.peak_memory = self.memory.peak
+        if self.memo is not None:
+            metrics.memo_hits = self.memo.hits
+            metrics.memo_misses = self.memo.misses
+        return metrics
+
+    async def execute(self, program, interpreter, context):
+        fn, text = program.fn, program.text
+        result = RTResult().success(Number.null)
+        try:
+            for node in program.nodes:
+                try:
+                    self.check_stop()
+                except KeyboardInterrupt:
+                    pos = Position(0, 0, 0, fn, text)
+                    return None, RTError(pos, pos, "Execution stopped by user", context)
+
+                result = await interpreter.evaluate(node, context)
+        except KeyboardInterrupt:
+            pos = Position(0, 0, 0, fn, text)
+            return None, RTError(pos, pos, "Execution stopped by user", context)
+        except Exception as e:
+            pos = Position(0, 0, 0, fn, text)
+            return None, RTError(pos, pos, f"Unhandled exception: {e}", context)
+
+        return result.value, result.error
+
+
+######################################
+# PROGRAM
+######################################
+
+def count_nodes(root):
+    count = 0
+    stack = [root]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Node):
+            count += 1
+            stack.extend(item.__dict__.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return count
+
+def compile_program(fn, text, optimize=True, optimize_loops=None, tail_calls=None):
+    text += "\n"
 
     # Generate tokens
+    start = time.perf_counter()
     lexer = Lexer(fn, text)
     tokens, error = lexer.make_tokens()
+    lex_time = time.perf_counter() - start
     if error: return None, error
 
     # Generate AST
-    parser = Parser(tokens)
+    start = time.perf_counter()
+    symbol_table = make_global_symbol_table()
+    parser = Parser(tokens, symbol_table)
     astL = parser.parse()
+    parse_time = time.perf_counter() - start
     for ast in astL:
         if ast.error: return None, ast.error
 
-    # Run program
-    interpreter = Interpreter()
-    context = Context('<program>')
-    context.symbol_table = global_symbol_table
-    try:
-        for ast in astL:
-            try:
-                check_stop()
-            except KeyboardInterrupt:
-                pos = Position(0, 0, 0, fn, text)
-                return None, RTError(pos, pos, "Execution stopped by user", context)
+    nodes = [ast.node for ast in astL]
+    node_count = count_nodes(nodes)
+    start = time.perf_counter()
+    if optimize:
+        nodes = Optimizer(symbol_table).optimize(nodes)
+    if tail_calls if tail_calls is not None else optimize:
+        nodes = TailCallOptimizer().optimize(nodes)
+    nodes = PurityAnalysis().analyze(nodes)
+    if optimize_loops if optimize_loops is not None else optimize:
+        nodes = LoopOptimizer(symbol_table.types).optimize(nodes)
+    optimize_time = time.perf_counter() - start
+
+    declarations = dict(symbol_table.types)
+    program = Program(fn, text, nodes, declarations)
+    program.lex_time = lex_time
+    program.parse_time = parse_time
+    program.optimize_time = optimize_time
+    program.token_count = len(tokens)
+    program.node_count = node_count
+    return program, None
+
+
+class Program:
+    def __init__(self, fn, text, nodes, declarations):
+        self.fn = fn
+        self.text = text
+        self.nodes = nodes
+        self.declarations = declarations
+        self.lex_time = 0.0
+        self.parse_time = 0.0
+        self.optimize_time = 0.0
+        self.token_count = 0
+        self.node_count = 0
+
+    async def run_async(self, inputs=None, write=None, session=None, limits=None):
+        value, error, _ = await self.run_with_metrics(inputs, write, session, limits)
+        return value, error
+
+    async def run_with_metrics(self, inputs=None, write=None, session=None, limits=None):
+        if session is None:
+            if inputs is not None:
+                session = InterpreterSession.from_inputs(inputs, write=write, limits=limits)
+            else:
+                session = InterpreterSession(write=write, limits=limits)
+        value, error = await session.run_program(self)
+        return value, error, session.metrics
 
-            result = await interpreter.visit(ast.node, context)
-    except KeyboardInterrupt:
-        pos = Position(0, 0, 0, fn, text)
-        return None, RTError(pos, pos, "Execution stopped by user", context)
-    except Exception as e:
-        pos = Position(0, 0, 0, fn, text)
-        return None, RTError(pos, pos, f"Unhandled exception: {e}", context)
 
-    return result.value, result.error
+async def run_async(fn, text, limits=None, profiler=None):
+    value, error, _ = await run_with_metrics(fn, text, limits, profiler)
+    return value, error
+
+async def run_with_metrics(fn, text, limits=None, profiler=None):
+    program, error = compile_program(fn, text)
+    if error: return None, error, None
+
+    try:
+        globals()["__stop_requested"] = False
+    except Exception:
+        pass
+
+    session = InterpreterSession(watch_global_stop=True, limits=limits, profiler=profiler)
+    return await program.run_with_metrics(session=session)
 
 
 ##### main #####
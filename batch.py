@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import gc
+import json
+import os
+import selectors
+import sys
+from collections import deque
+
+from basic import compile_program, Coverage, InterpreterSession, MemoryProfiler, RunLimits
+
+
+######################################
+# BATCH RUNNER
+######################################
+
+async def run_case(program, inputs, limits=None, coverage=None, memory=False):
+    output = []
+    session = InterpreterSession.from_inputs(inputs, write=output.append, limits=limits, coverage=coverage,
+                                             memory=MemoryProfiler() if memory else None)
+    _, error, metrics = await program.run_with_metrics(session=session)
+    result = {
+        "output": "".join(output),
+        "error": error.as_string() if error else None,
+        "metrics": metrics.as_dict(),
+    }
+    if coverage:
+        result["coverage"] = Coverage.to_hex(session.coverage_bitmap)
+    return result
+
+def run_inline(program, input_sets, limits=None, coverage=None, memory=False):
+    return [asyncio.run(run_case(program, inputs, limits, coverage, memory)) for inputs in input_sets]
+
+def run_forked(program, input_sets, jobs=1, limits=None, coverage=None, memory=False):
+    # The parent only compiles; every case runs in a copy-on-write child of
+    # this warmed-up process, so a case costs nothing but its execution.
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+
+    results = [None] * len(input_sets)
+    running = selectors.DefaultSelector()
+    pending = deque(enumerate(input_sets))
+
+    while pending or running.get_map():
+        while pending and len(running.get_map()) < max(1, jobs):
+            index, inputs = pending.popleft()
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read_fd)
+                try:
+                    payload = json.dumps(asyncio.run(run_case(program, inputs, limits, coverage, memory)))
+                except BaseException as e:
+                    payload = json.dumps({"output": "", "error": f"Worker crashed: {e}"})
+                with os.fdopen(write_fd, "w", encoding="utf-8") as f:
+                    f.write(payload)
+                os._exit(0)
+            os.close(write_fd)
+            running.register(read_fd, selectors.EVENT_READ, (pid, index, []))
+
+        # Drain the pipes as they fill: a child with a large result blocks
+        # on its write until the parent reads, so it is only reaped at EOF
+        for key, _ in running.select():
+            pid, index, chunks = key.data
+            chunk = os.read(key.fd, 65536)
+            if chunk:
+                chunks.append(chunk)
+                continue
+            running.unregister(key.fd)
+            os.close(key.fd)
+            os.waitpid(pid, 0)
+            try:
+                results[index] = json.loads(b"".join(chunks).decode("utf-8"))
+            except ValueError:
+                results[index] = {"output": "", "error": "Worker exited without a result"}
+
+    running.close()
+    return results
+
+def run_batch(program, input_sets, fork=False, jobs=1, limits=None, coverage=None, memory=False):
+    if fork and hasattr(os, "fork"):
+        return run_forked(program, input_sets, jobs, limits, coverage, memory)
+    return run_inline(program, input_sets, limits, coverage, memory)
+
+def write_coverage(coverage, results, path):
+    bitmaps = [Coverage.from_hex(result.get("coverage")) for result in results]
+    merged = Coverage.merge(bitmaps)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(coverage.report(merged) + "\n")
+    needed = coverage.minimal_runs(bitmaps)
+    print(f"coverage: {coverage.percent(merged):.1f}% of {coverage.statement_count} statements; "
+          f"cases {needed} reach it ({len(results) - len(needed)} add nothing)", file=sys.stderr)
+
+
+##### main #####
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run one DAUPS program against many input sets.")
+    parser.add_argument("source", help="DAUPS source file")
+    parser.add_argument("inputs", help="JSON file holding a list of input sets (each a list of lines)")
+    parser.add_argument("--fork", action="store_true", help="run each case in a forked snapshot of the compiled worker")
+    parser.add_argument("--jobs", type=int, default=1, help="number of forked cases to run at once")
+    parser.add_argument("--max-steps", type=int, default=None, help="per-case step limit")
+    parser.add_argument("--timeout", type=float, default=None, help="per-case execution time limit in seconds")
+    parser.add_argument("--max-array-elements", type=int, default=None, help="per-case budget of array elements created (pop gives one back)")
+    parser.add_argument("--max-output-bytes", type=int, default=None, help="per-case cap on printed bytes")
+    parser.add_argument("--max-call-depth", type=int, default=RunLimits.MAX_CALL_DEPTH, help="per-case cap on nested function calls")
+    parser.add_argument("--memory", action="store_true", help="trace allocations and report each case's peak_memory in its metrics")
+    parser.add_argument("--coverage", metavar="PATH", help="record statement coverage per case and write the merged annotated source")
+    args = parser.parse_args(argv)
+
+    with open(args.source, "r", encoding="utf-8") as f:
+        source = f.read()
+    with open(args.inputs, "r", encoding="utf-8") as f:
+        input_sets = json.load(f)
+
+    program, error = compile_program(args.source, source)
+    if error:
+        print(error.as_string(), file=sys.stderr)
+        return 1
+
+    limits = RunLimits(args.max_steps, args.timeout, args.max_array_elements, args.max_output_bytes, args.max_call_depth)
+    coverage = Coverage(program) if args.coverage else None
+    results = run_batch(program, input_sets, args.fork, args.jobs, limits, coverage, args.memory)
+    for index, result in enumerate(results):
+        print(json.dumps({"case": index, **result}))
+    if coverage:
+        write_coverage(coverage, results, args.coverage)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
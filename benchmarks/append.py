@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from basic import compile_program, InterpreterSession
+
+# Growing an array one element at a time: the copy loop students write when
+# arrays have a fixed size, against append on the array's own storage
+COPY_LOOP = """Algo
+    T, U: array of int
+    i, j, n: int
+Begin
+    n <-- {n}
+    T <-- create_array(0)
+    for i <-- 1 to n
+        U <-- create_array(i)
+        for j <-- 0 to i - 2
+            U[j] <-- T[j]
+        U[i - 1] <-- i
+        T <-- U
+    print size(T)
+End
+"""
+
+APPEND = """Algo
+    T: array of int
+    i, n: int
+Begin
+    n <-- {n}
+    T <-- create_array(0)
+    for i <-- 1 to n
+        append(T, i)
+    print size(T)
+End
+"""
+
+
+######################################
+# MEASUREMENTS
+######################################
+
+def measure(template, n, trials):
+    program, error = compile_program("<bench>", template.format(n=n))
+    if error:
+        raise RuntimeError(error.as_string())
+    times = []
+    for _ in range(trials):
+        output = []
+        session = InterpreterSession.from_inputs([], write=output.append)
+        start = time.perf_counter()
+        _, error = asyncio.run(session.run_program(program))
+        times.append(time.perf_counter() - start)
+        if error:
+            raise RuntimeError(error.as_string())
+        if "".join(output).strip() != str(n):
+            raise RuntimeError(f"expected an array of {n} elements, got {''.join(output)!r}")
+    return statistics.median(times)
+
+
+##### main #####
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time to grow a DAUPS array to n elements with a copy loop and with append.")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[250, 500, 1000])
+    parser.add_argument("--trials", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'n':>8} {'copy loop':>12} {'append':>12} {'speedup':>9}")
+    for n in args.sizes:
+        copy_loop = measure(COPY_LOOP, n, args.trials)
+        append = measure(APPEND, n, args.trials)
+        print(f"{n:>8} {copy_loop * 1000:9.2f} ms {append * 1000:9.2f} ms {copy_loop / append:8.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import argparse
+import random
+import sys
+
+
+######################################
+# SOURCE GENERATOR
+######################################
+
+KINDS = ("if_chains", "expressions", "functions", "declarations", "mixed")
+OPERATORS = ("+", "-", "*", "div", "mod")
+COMPARISONS = ("<", ">", "<=", ">=", "==", "!=")
+
+
+class SourceGenerator:
+    def __init__(self, seed=0, chain_depth=40, expression_terms=60):
+        self.random = random.Random(seed)
+        self.chain_depth = chain_depth
+        self.expression_terms = expression_terms
+        self.counter = 0
+
+    def fresh_name(self, prefix):
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    def expression(self, names, terms):
+        rnd = self.random
+        parts = [rnd.choice(names)]
+        for _ in range(terms - 1):
+            operand = rnd.choice(names) if rnd.random() < 0.6 else str(rnd.randint(1, 999))
+            if rnd.random() < 0.1:
+                operand = f"({operand} + {rnd.randint(1, 9)})"
+            parts.append(rnd.choice(OPERATORS))
+            parts.append(operand)
+        return " ".join(parts)
+
+    def if_chain(self, names, indent):
+        pad = "    " * indent
+        lines = []
+        for depth in range(self.chain_depth):
+            keyword = "if" if depth == 0 else "else if"
+            condition = f"{self.random.choice(names)} {self.random.choice(COMPARISONS)} {depth}"
+            lines.append(f"{pad}{keyword} {condition} then")
+            lines.append(f"{pad}    {self.random.choice(names)} <-- {self.expression(names, 3)}")
+        lines.append(f"{pad}else")
+        lines.append(f"{pad}    {names[0]} <-- 0")
+        return lines
+
+    def algo(self, kind, body_bytes):
+        names = [self.fresh_name("v") for _ in range(8)]
+        lines = ["Algo", f"    {', '.join(names)}: int"]
+        if kind == "declarations":
+            while sum(len(line) + 1 for line in lines) < body_bytes:
+                block = [self.fresh_name("d") for _ in range(12)]
+                lines.append(f"    {', '.join(block)}: {self.random.choice(('int', 'float', 'str', 'bool'))}")
+                lines.append(f"    {self.fresh_name('a')}: array of int")
+        lines.append("Begin")
+        size = sum(len(line) + 1 for line in lines)
+        statements = 0
+        while size < body_bytes or statements == 0:
+            statements += 1
+            if kind == "if_chains":
+                block = self.if_chain(names, 1)
+            elif kind == "expressions":
+                block = [f"    {self.random.choice(names)} <-- {self.expression(names, self.expression_terms)}"]
+            else:
+                block = [f"    {self.random.choice(names)} <-- {self.expression(names, 4)}"]
+            lines.extend(block)
+            size += sum(len(line) + 1 for line in block)
+        lines.append("End")
+        return lines
+
+    def function(self):
+        name = self.fresh_name("f")
+        params = [self.fresh_name("p") for _ in range(self.random.randint(1, 3))]
+        local = self.fresh_name("l")
+        signature = ", ".join(f"{param}: int" for param in params)
+        lines = [f"function {name}({signature}): int", f"    {local}: int", "    Begin"]
+        lines.append(f"        {local} <-- {self.expression(params, 5)}")
+        lines.append(f"        if {params[0]} > {local} then return {params[0]}")
+        lines.append(f"        return {local}")
+        lines.append("    End")
+        return lines
+
+    def generate(self, kind, target_bytes):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown source kind '{kind}'")
+
+        lines = []
+        if kind in ("functions", "mixed"):
+            share = target_bytes if kind == "functions" else target_bytes // 3
+            size = 0
+            while size < share:
+                block = self.function()
+                lines.extend(block)
+                size += sum(len(line) + 1 for line in block)
+            target_bytes -= size
+
+        if kind == "mixed":
+            third = max(target_bytes // 3, 1)
+            for part in ("declarations", "if_chains", "expressions"):
+                lines.extend(self.algo(part, third))
+        else:
+            lines.extend(self.algo(kind, max(target_bytes, 1)))
+        return "\n".join(lines) + "\n"
+
+
+def generate_source(kind, target_bytes, seed=0):
+    return SourceGenerator(seed).generate(kind, target_bytes)
+
+
+##### main #####
+
+def parse_size(text):
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    text = text.strip().lower().rstrip("b")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic DAUPS sources of a given size.")
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("size", type=parse_size, help="approximate size, e.g. 64K or 10M")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write to a file instead of stdout")
+    args = parser.parse_args(argv)
+
+    source = generate_source(args.kind, args.size, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(source)
+    else:
+        sys.stdout.write(source)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Appended rather than prepended so that 'run' resolves to benchmarks/run.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from basic import InterpreterSession, TraceHook, compile_program
+from run import load_workloads
+
+
+######################################
+# HOOKS
+######################################
+
+class NodeCounter(TraceHook):
+    def __init__(self):
+        self.nodes = 0
+
+    def on_node_enter(self, node, context):
+        self.nodes += 1
+
+
+class NodeTimer(TraceHook):
+    def __init__(self):
+        self.stack = []
+        self.total = 0.0
+
+    def on_node_enter(self, node, context):
+        self.stack.append(time.perf_counter())
+
+    def on_node_exit(self, node, context, result):
+        self.total += time.perf_counter() - self.stack.pop()
+
+
+class EventLog(TraceHook):
+    def __init__(self):
+        self.events = 0
+
+    def on_call(self, name, node, context): self.events += 1
+    def on_return(self, name, result, node, context): self.events += 1
+    def on_assign(self, name, value, node, context): self.events += 1
+    def on_print(self, text): self.events += 1
+    def on_get(self, text): self.events += 1
+
+
+class PrintOnly(TraceHook):
+    def on_print(self, text): pass
+
+
+CONFIGURATIONS = {
+    "none": lambda: [],
+    "print-only": lambda: [PrintOnly()],
+    "one": lambda: [NodeCounter()],
+    "several": lambda: [NodeCounter(), NodeTimer(), EventLog()],
+}
+
+
+######################################
+# MEASUREMENTS
+######################################
+
+def execute(program, inputs, hooks):
+    session = InterpreterSession.from_inputs(inputs or [], write=lambda s: None, hooks=hooks)
+    start = time.perf_counter()
+    _, error = asyncio.run(session.run_program(program))
+    return time.perf_counter() - start, error
+
+
+##### main #####
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Overhead of tracing hooks on the DAUPS benchmark workloads.")
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="workload names to run")
+    args = parser.parse_args(argv)
+
+    print(f"{'workload':<20}" + "".join(f"{name:>22}" for name in CONFIGURATIONS))
+    for name, source, inputs in load_workloads(args.only):
+        program, error = compile_program(name, source)
+        if error:
+            print(f"{name:<20} {error.error_name}: {error.details}")
+            continue
+
+        execute(program, inputs, [])  # warm-up
+        medians = {}
+        for config, make_hooks in CONFIGURATIONS.items():
+            times = []
+            for _ in range(args.trials):
+                elapsed, error = execute(program, inputs, make_hooks())
+                times.append(elapsed)
+            medians[config] = statistics.median(times)
+        if error:
+            print(f"{name:<20} {error.error_name}: {error.details}")
+            continue
+
+        base = medians["none"]
+        cells = []
+        for config, median in medians.items():
+            overhead = (median - base) / base * 100 if base else 0.0
+            cells.append(f"{median * 1000:10.2f} ms {overhead:+6.1f}%" if config != "none" else f"{median * 1000:10.2f} ms        ")
+        print(f"{name:<20}" + "".join(f"{cell:>22}" for cell in cells))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
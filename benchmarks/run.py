@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from basic import HoistedNode, InterpreterSession, TraceHook, compile_program
+
+PROGRAMS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "programs")
+PHASES = ("lex", "parse", "optimize", "execute")
+MEMORY_SLACK = 64 * 1024
+
+# n * n + 3 is invariant in the loop, so it should be evaluated once and then served from the loop cache
+HOISTING_SOURCE = """Algo
+    n, i, x: int
+Begin
+    n <-- 12
+    x <-- 0
+    for i <-- 1 to 1000
+        x <-- x + (n * n + 3)
+    print x
+End
+"""
+
+
+######################################
+# WORKLOADS
+######################################
+
+def load_workloads(names=None):
+    workloads = []
+    for entry in sorted(os.listdir(PROGRAMS_DIR)):
+        name, ext = os.path.splitext(entry)
+        if ext != ".daups" or (names and name not in names):
+            continue
+        with open(os.path.join(PROGRAMS_DIR, entry), "r", encoding="utf-8") as f:
+            source = f.read()
+        inputs_path = os.path.join(PROGRAMS_DIR, name + ".json")
+        inputs = None
+        if os.path.exists(inputs_path):
+            with open(inputs_path, "r", encoding="utf-8") as f:
+                inputs = json.load(f)
+        workloads.append((name, source, inputs))
+    return workloads
+
+def execute(program, inputs):
+    session = InterpreterSession.from_inputs(inputs or [], write=lambda s: None)
+    start = time.perf_counter()
+    _, error = asyncio.run(session.run_program(program))
+    return time.perf_counter() - start, error
+
+def run_output(name, source, inputs, optimize):
+    program, error = compile_program(name, source, optimize=optimize)
+    if error:
+        return "", f"{error.error_name}: {error.details}"
+    output = []
+    session = InterpreterSession.from_inputs(inputs or [], write=output.append)
+    _, error = asyncio.run(session.run_program(program))
+    return "".join(output), error and f"{error.error_name}: {error.details}"
+
+def measure_memory(program, inputs):
+    tracemalloc.start()
+    try:
+        execute(program, inputs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_workload(name, source, inputs, trials, memory):
+    result = {phase: [] for phase in PHASES}
+    result["error"] = None
+    for _ in range(trials):
+        program, error = compile_program(name, source)
+        if error:
+            result["error"] = f"{error.error_name}: {error.details}"
+            return result
+        result["lex"].append(program.lex_time)
+        result["parse"].append(program.parse_time)
+        result["optimize"].append(program.optimize_time)
+        exec_time, error = execute(program, inputs)
+        if error:
+            result["error"] = f"{error.error_name}: {error.details}"
+            return result
+        result["execute"].append(exec_time)
+
+    if memory:
+        program, _ = compile_program(name, source)
+        result["peak_memory"] = measure_memory(program, inputs)
+    return result
+
+
+######################################
+# STATISTICS
+######################################
+
+def betacf(a, b, x):
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c, d = 1.0, 1.0 - qab * x / qap
+    d = 1.0 / (d if abs(d) > 1e-300 else 1e-300)
+    h = d
+    for m in range(1, 200):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > 1e-300 else 1e-300)
+        c = 1.0 + aa / c if abs(c) > 1e-300 else 1e-300
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > 1e-300 else 1e-300)
+        c = 1.0 + aa / c if abs(c) > 1e-300 else 1e-300
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < 3e-12:
+            break
+    return h
+
+def incomplete_beta(a, b, x):
+    if x <= 0.0: return 0.0
+    if x >= 1.0: return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1.0 - x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * betacf(a, b, x) / a
+    return 1.0 - front * betacf(b, a, 1.0 - x) / b
+
+def welch_t_test(sample_a, sample_b):
+    n_a, n_b = len(sample_a), len(sample_b)
+    if n_a < 2 or n_b < 2:
+        return 1.0
+    var_a, var_b = statistics.variance(sample_a) / n_a, statistics.variance(sample_b) / n_b
+    if var_a + var_b == 0:
+        return 0.0 if statistics.mean(sample_a) != statistics.mean(sample_b) else 1.0
+    t = (statistics.mean(sample_a) - statistics.mean(sample_b)) / math.sqrt(var_a + var_b)
+    df = (var_a + var_b) ** 2 / (var_a ** 2 / (n_a - 1) + var_b ** 2 / (n_b - 1))
+    return incomplete_beta(df / 2.0, 0.5, df / (df + t * t))
+
+def compare(baseline, current, alpha, threshold):
+    rows = []
+    for name, cur in sorted(current["benchmarks"].items()):
+        base = baseline["benchmarks"].get(name)
+        if base is None or base.get("error") or cur.get("error"):
+            rows.append((name, "-", None, None, None, "skipped"))
+            continue
+        for phase in PHASES:
+            # Baselines recorded before a phase was measured simply lack it
+            if not base.get(phase) or not cur.get(phase):
+                continue
+            base_mean, cur_mean = statistics.mean(base[phase]), statistics.mean(cur[phase])
+            change = (cur_mean - base_mean) / base_mean if base_mean else 0.0
+            p_value = welch_t_test(base[phase], cur[phase])
+            if p_value < alpha and change > threshold:
+                verdict = "REGRESSION"
+            elif p_value < alpha and change < -threshold:
+                verdict = "improvement"
+            else:
+                verdict = "ok"
+            rows.append((name, phase, base_mean, cur_mean, (change, p_value), verdict))
+        if "peak_memory" in base and "peak_memory" in cur and base["peak_memory"]:
+            growth = cur["peak_memory"] - base["peak_memory"]
+            change = growth / base["peak_memory"]
+            verdict = "REGRESSION" if change > max(threshold, 0.25) and growth > MEMORY_SLACK else "ok"
+            rows.append((name, "memory", base["peak_memory"], cur["peak_memory"], (change, None), verdict))
+    return rows
+
+
+##### main #####
+
+def command_run(args):
+    workloads = load_workloads(args.only)
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "trials": args.trials,
+            "timestamp": time.time(),
+        },
+        "benchmarks": {},
+    }
+    for name, source, inputs in workloads:
+        result = run_workload(name, source, inputs, args.trials, args.memory)
+        results["benchmarks"][name] = result
+        if result["error"]:
+            print(f"{name:<20} {result['error']}")
+            continue
+        summary = "  ".join(f"{phase} {statistics.median(result[phase]) * 1000:9.3f} ms" for phase in PHASES)
+        if "peak_memory" in result:
+            summary += f"  peak {result['peak_memory'] / 1024:8.1f} KiB"
+        print(f"{name:<20} {summary}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+def command_compare(args):
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+
+    regressions = 0
+    for name, phase, base_value, cur_value, stats, verdict in compare(baseline, current, args.alpha, args.threshold):
+        if stats is None:
+            print(f"{name:<20} {verdict}")
+            continue
+        change, p_value = stats
+        p_text = f"p={p_value:.4f}" if p_value is not None else ""
+        if phase == "memory":
+            values = f"{base_value / 1024:10.1f} KiB -> {cur_value / 1024:10.1f} KiB"
+        else:
+            values = f"{base_value * 1000:10.3f} ms -> {cur_value * 1000:10.3f} ms"
+        print(f"{name:<20} {phase:<8} {values}  {change * 100:+7.2f}%  {p_text:<10} {verdict}")
+        regressions += verdict == "REGRESSION"
+    return 1 if regressions else 0
+
+# Loops must not keep a value per iteration: their peak memory may not grow with the iteration count
+LOOP_SOURCES = {
+    "for": """Algo
+    i, s: int
+Begin
+    s <-- 0
+    for i <-- 1 to {n}
+        s <-- s + i
+    print s
+End
+""",
+    "while": """Algo
+    i: int
+Begin
+    i <-- 0
+    while i < {n}
+        i <-- i + 1
+    print i
+End
+""",
+}
+LOOP_ITERATIONS = (1000, 100000)
+
+class HoistedEvaluations(TraceHook):
+    def __init__(self, program):
+        self.hoisted = {}
+        stack = list(program.nodes)
+        while stack:
+            item = stack.pop()
+            if isinstance(item, (list, tuple)):
+                stack.extend(item)
+            elif hasattr(item, "__dict__"):
+                if isinstance(item, HoistedNode):
+                    self.hoisted[id(item.node)] = 0
+                stack.extend(item.__dict__.values())
+
+    def on_node_enter(self, node, context):
+        if id(node) in self.hoisted:
+            self.hoisted[id(node)] += 1
+
+def check_hoisting():
+    program, error = compile_program("hoisting", HOISTING_SOURCE)
+    if error:
+        return f"{error.error_name}: {error.details}"
+    counter = HoistedEvaluations(program)
+    if not counter.hoisted:
+        return "nothing was hoisted"
+    session = InterpreterSession.from_inputs([], write=lambda s: None, hooks=[counter])
+    _, error = asyncio.run(session.run_program(program))
+    if error:
+        return f"{error.error_name}: {error.details}"
+    evaluations = max(counter.hoisted.values())
+    if evaluations != 1:
+        return f"a hoisted expression was evaluated {evaluations} times instead of once"
+    return None
+
+def check_loop_memory(kind):
+    peaks = []
+    for n in LOOP_ITERATIONS:
+        program, error = compile_program(kind, LOOP_SOURCES[kind].replace("{n}", str(n)))
+        if error:
+            return f"{error.error_name}: {error.details}"
+        peaks.append(measure_memory(program, None))
+    growth = peaks[-1] - peaks[0]
+    if growth > MEMORY_SLACK:
+        return (f"peak grew by {growth / 1024:.1f} KiB from {LOOP_ITERATIONS[0]} "
+                f"to {LOOP_ITERATIONS[-1]} iterations")
+    return None
+
+def command_check(args):
+    # The optimizer must never change what a program prints or how it fails
+    mismatches = 0
+    for name, source, inputs in load_workloads(args.only):
+        optimized = run_output(name, source, inputs, True)
+        plain = run_output(name, source, inputs, False)
+        if optimized == plain:
+            print(f"{name:<20} ok")
+            continue
+        mismatches += 1
+        print(f"{name:<20} MISMATCH")
+        for label, (output, error) in (("optimized", optimized), ("plain", plain)):
+            print(f"    {label:<10} output {output[:60]!r}  error {error}")
+
+    problems = {"(hoisting)": check_hoisting()}
+    for kind in LOOP_SOURCES:
+        problems[f"({kind} memory)"] = check_loop_memory(kind)
+    for name, problem in problems.items():
+        print(f"{name:<20} {problem or 'ok'}")
+        mismatches += problem is not None
+    return 1 if mismatches else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DAUPS interpreter benchmarks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="time lexing, parsing and execution of every workload")
+    run_parser.add_argument("--trials", type=int, default=10)
+    run_parser.add_argument("--only", nargs="*", help="workload names to run")
+    run_parser.add_argument("--memory", action="store_true", help="also record peak traced memory of one execution")
+    run_parser.add_argument("-o", "--output", help="write the results as JSON")
+    run_parser.set_defaults(handler=command_run)
+
+    compare_parser = commands.add_parser("compare", help="flag significant changes against a stored baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--alpha", type=float, default=0.01, help="significance level of Welch's t-test")
+    compare_parser.add_argument("--threshold", type=float, default=0.05, help="smallest relative change worth flagging")
+    compare_parser.set_defaults(handler=command_compare)
+
+    check_parser = commands.add_parser("check", help="compare every workload's output with and without the optimizer")
+    check_parser.add_argument("--only", nargs="*", help="workload names to check")
+    check_parser.set_defaults(handler=command_check)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from basic import compile_program, InterpreterSession, String
+
+# The usual way to build a string in DAUPS, printed once at the end
+TEMPLATE = """Algo
+    i: int
+    s: str
+Begin
+    s <-- ""
+    for i <-- 1 to {count}
+        s <-- s + "{piece}"
+    print s
+End
+"""
+
+
+######################################
+# MEASUREMENTS
+######################################
+
+def measure(length, piece_length, trials, builder):
+    count = length // piece_length
+    program, error = compile_program("<bench>", TEMPLATE.format(count=count, piece="x" * piece_length))
+    if error:
+        raise RuntimeError(error.as_string())
+
+    # Without the builder every append copies the whole text, as it used to
+    saved = String.BUILDER_MIN_LENGTH
+    String.BUILDER_MIN_LENGTH = saved if builder else float("inf")
+    try:
+        times = []
+        for _ in range(trials):
+            output = []
+            session = InterpreterSession.from_inputs([], write=output.append)
+            start = time.perf_counter()
+            _, error = asyncio.run(session.run_program(program))
+            times.append(time.perf_counter() - start)
+            if error:
+                raise RuntimeError(error.as_string())
+            if len("".join(output).strip()) != count * piece_length:
+                raise RuntimeError("the program built a string of the wrong length")
+    finally:
+        String.BUILDER_MIN_LENGTH = saved
+    return statistics.median(times)
+
+
+##### main #####
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time to build long DAUPS strings with 's <-- s + piece', with and without the string builder.")
+    parser.add_argument("--lengths", type=int, nargs="*", default=[10 ** 4, 10 ** 5, 10 ** 6], help="characters to build")
+    parser.add_argument("--piece-length", type=int, default=10, help="characters appended per step")
+    parser.add_argument("--max-flat-length", type=int, default=10 ** 5,
+                        help="longest string to also build without the builder (that run is quadratic)")
+    parser.add_argument("--trials", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'length':>10} {'steps':>9} {'flat':>12} {'builder':>12} {'speedup':>9}")
+    for length in args.lengths:
+        steps = length // args.piece_length
+        built = measure(length, args.piece_length, args.trials, builder=True)
+        if length <= args.max_flat_length:
+            flat = measure(length, args.piece_length, args.trials, builder=False)
+            print(f"{length:>10} {steps:>9} {flat * 1000:9.2f} ms {built * 1000:9.2f} ms {flat / built:8.1f}x")
+        else:
+            print(f"{length:>10} {steps:>9} {'-':>12} {built * 1000:9.2f} ms {'-':>9}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Appended rather than prepended so that 'run' resolves to benchmarks/run.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from basic import compile_program, InterpreterSession
+from run import load_workloads
+
+WORKLOADS = ("tail_recursion", "deep_recursion", "recursion")
+
+
+######################################
+# MEASUREMENTS
+######################################
+
+def execute(program, inputs):
+    session = InterpreterSession.from_inputs(inputs or [], write=lambda s: None)
+    start = time.perf_counter()
+    _, error = asyncio.run(session.run_program(program))
+    return time.perf_counter() - start, error, session.metrics
+
+def measure(source, inputs, trials, tail_calls):
+    program, error = compile_program("<bench>", source, tail_calls=tail_calls)
+    if error:
+        return None, None, error
+    execute(program, inputs)  # warm-up
+    times = []
+    for _ in range(trials):
+        elapsed, error, metrics = execute(program, inputs)
+        if error:
+            return None, None, error
+        times.append(elapsed)
+    return statistics.median(times), metrics, None
+
+
+##### main #####
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Execution time and call depth of recursive DAUPS workloads with and without tail-call elimination.")
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--only", nargs="*", default=list(WORKLOADS), help="workload names to run")
+    args = parser.parse_args(argv)
+
+    print(f"{'workload':<20} {'before':>12} {'depth':>8} {'after':>12} {'depth':>8} {'speedup':>9}")
+    for name, source, inputs in load_workloads(args.only):
+        before, before_metrics, error = measure(source, inputs, args.trials, tail_calls=False)
+        if not error:
+            after, after_metrics, error = measure(source, inputs, args.trials, tail_calls=True)
+        if error:
+            print(f"{name:<20} {error.error_name}: {error.details}")
+            continue
+        print(f"{name:<20} {before * 1000:9.2f} ms {before_metrics.max_call_depth:>8} "
+              f"{after * 1000:9.2f} ms {after_metrics.max_call_depth:>8} {before / after:8.2f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
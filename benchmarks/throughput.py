@@ -0,0 +1,116 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.setrecursionlimit(max(sys.getrecursionlimit(), 20000))
+
+from basic import Lexer, Parser, count_nodes, make_global_symbol_table
+from generate import KINDS, generate_source, parse_size
+
+
+######################################
+# MEASUREMENTS
+######################################
+
+def lex(source):
+    tokens, error = Lexer("<generated>", source).make_tokens()
+    if error: raise RuntimeError(error.as_string())
+    return tokens
+
+def parse(tokens):
+    astL = Parser(tokens, make_global_symbol_table()).parse()
+    nodes = []
+    for ast in astL:
+        if ast.error: raise RuntimeError(ast.error.as_string())
+        nodes.append(ast.node)
+    return nodes
+
+def measure(source, memory):
+    clock = time.perf_counter
+    start = clock()
+    tokens = lex(source)
+    lex_time = clock() - start
+
+    start = clock()
+    nodes = parse(tokens)
+    parse_time = clock() - start
+
+    result = {
+        "bytes": len(source),
+        "tokens": len(tokens),
+        "nodes": count_nodes(nodes),
+        "lex_time": lex_time,
+        "parse_time": parse_time,
+    }
+    result["tokens_per_second"] = result["tokens"] / lex_time if lex_time else 0.0
+    result["nodes_per_second"] = result["nodes"] / parse_time if parse_time else 0.0
+
+    if memory:
+        del tokens, nodes
+        tracemalloc.start()
+        try:
+            parse(lex(source))
+            result["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+def scaling_exponent(points, key):
+    # Slope of log(time) against log(size): ~1 is linear, ~2 is quadratic
+    xs = [math.log(p["bytes"]) for p in points if p[key] > 0]
+    ys = [math.log(p[key]) for p in points if p[key] > 0]
+    if len(xs) < 2:
+        return None
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x if var_x else None
+
+
+##### main #####
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lexer and parser throughput on generated DAUPS sources.")
+    parser.add_argument("--kinds", nargs="*", default=list(KINDS), choices=KINDS)
+    parser.add_argument("--min-size", type=parse_size, default=parse_size("1K"))
+    parser.add_argument("--max-size", type=parse_size, default=parse_size("10M"))
+    parser.add_argument("--factor", type=float, default=4.0, help="growth factor between sizes")
+    parser.add_argument("--memory", action="store_true", help="record peak traced memory (slow on large sources)")
+    parser.add_argument("-o", "--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    sizes = []
+    size = args.min_size
+    while size <= args.max_size:
+        sizes.append(int(size))
+        size *= args.factor
+
+    results = {}
+    for kind in args.kinds:
+        points = []
+        for size in sizes:
+            point = measure(generate_source(kind, size), args.memory)
+            points.append(point)
+            line = (f"{kind:<13} {point['bytes'] / 1024:>10.1f} KiB  "
+                    f"lex {point['tokens_per_second']:>12,.0f} tok/s  "
+                    f"parse {point['nodes_per_second']:>12,.0f} nodes/s")
+            if "peak_memory" in point:
+                line += f"  peak {point['peak_memory'] / 1024 ** 2:>8.1f} MiB"
+            print(line, flush=True)
+        lex_exponent = scaling_exponent(points, "lex_time")
+        parse_exponent = scaling_exponent(points, "parse_time")
+        if lex_exponent is not None:
+            print(f"{kind:<13} scaling exponent: lex {lex_exponent:.2f}, parse {parse_exponent:.2f}\n")
+        results[kind] = {"points": points, "lex_exponent": lex_exponent, "parse_exponent": parse_exponent}
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from server import ExecutionServer, add_limit_arguments, limits_from_args
+
+
+DEFAULT_PROGRAM = """Algo
+    i, n, s: int
+Begin
+    get n
+    s <-- 0
+    for i <-- 1 to n
+        s <-- s + i * i
+    print s
+End
+"""
+
+
+######################################
+# LOAD GENERATOR
+######################################
+
+async def run_client(host, port, source, inputs):
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port, limit=2 ** 24)
+    try:
+        writer.write((json.dumps({"type": "run", "source": source, "inputs": inputs}) + "\n").encode("utf-8"))
+        await writer.drain()
+        while True:
+            line = await reader.readline()
+            if not line:
+                return time.perf_counter() - start, "connection closed"
+            message = json.loads(line)
+            if message["type"] == "input":
+                writer.write((json.dumps({"type": "input", "value": ""}) + "\n").encode("utf-8"))
+                await writer.drain()
+            elif message["type"] == "result":
+                return time.perf_counter() - start, message["error"]
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
+
+async def generate_load(args, source):
+    tcp_server = None
+    if args.spawn:
+        server = ExecutionServer(args.slice_steps, limits_from_args(args))
+        tcp_server = await server.start(args.host, args.port)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        run_client(args.host, args.port, source, [str(args.iterations)])
+        for _ in range(args.sessions)
+    ), return_exceptions=True)
+    wall = time.perf_counter() - start
+
+    if tcp_server:
+        while server.open_connections:
+            await asyncio.sleep(0.01)
+        tcp_server.close()
+        await tcp_server.wait_closed()
+
+    latencies = [r[0] for r in results if not isinstance(r, BaseException)]
+    failures = [r for r in results if isinstance(r, BaseException) or r[1]]
+    return {
+        "sessions": args.sessions,
+        "iterations": args.iterations,
+        "wall_time": wall,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "failures": len(failures),
+        "latency_mean": statistics.mean(latencies) if latencies else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies) if latencies else 0.0,
+    }
+
+
+##### main #####
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure throughput and tail latency of the DAUPS execution server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sessions", type=int, default=1000, help="concurrent client sessions")
+    parser.add_argument("--iterations", type=int, default=200, help="loop length fed to the default program")
+    parser.add_argument("--source", help="DAUPS file to run instead of the default program (its first 'get' receives --iterations)")
+    parser.add_argument("--spawn", action="store_true", help="start an in-process server instead of connecting to a running one")
+    parser.add_argument("--slice-steps", type=int, default=200)
+    add_limit_arguments(parser)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    source = DEFAULT_PROGRAM
+    if args.source:
+        with open(args.source, "r", encoding="utf-8") as f:
+            source = f.read()
+
+    report = asyncio.run(generate_load(args, source))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for key, value in report.items():
+        print(f"{key:>14}: {value:.4f}" if isinstance(value, float) else f"{key:>14}: {value}")
+
+if __name__ == "__main__":
+    main()
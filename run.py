@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from basic import compile_program, InterpreterSession, MemoCache, MemoryProfiler, Profiler, RunLimits, SamplingProfiler
+
+
+##### main #####
+
+async def run(args):
+    try:
+        with open(args.source, 'r', encoding='utf-8') as f:
+            source = f.read()
+    except IOError as e:
+        print(f"Error opening file {args.source}: {e}", file=sys.stderr)
+        return 1
+
+    program, error = compile_program(args.source, source, optimize=not args.no_optimize,
+                                     optimize_loops=not (args.no_optimize or args.no_loop_optimize),
+                                     tail_calls=not (args.no_optimize or args.no_tail_calls))
+    if error:
+        print(error.as_string())
+        return 1
+
+    profiler = None
+    if args.sample or args.flamegraph:
+        profiler = SamplingProfiler(interval=args.sample_interval / 1000)
+    elif args.profile or args.profile_json:
+        profiler = Profiler()
+
+    memory = MemoryProfiler() if args.memory or args.memory_json else None
+
+    session = InterpreterSession(
+        limits=RunLimits(args.max_steps, args.timeout, args.max_array_elements, args.max_output_bytes, args.max_call_depth),
+        profiler=profiler,
+        memory=memory,
+        stackless=not args.no_stackless,
+        memoize=args.memoize,
+    )
+    _, error = await session.run_program(program)
+    if error:
+        print(error.as_string())
+
+    if args.metrics:
+        print("\n" + session.metrics.summary(), file=sys.stderr)
+    if args.metrics_json:
+        with open(args.metrics_json, 'w', encoding='utf-8') as f:
+            json.dump(session.metrics.as_dict(), f, indent=2)
+
+    if memory:
+        if args.memory:
+            print("\n" + memory.report(), file=sys.stderr)
+        if args.memory_json:
+            with open(args.memory_json, 'w', encoding='utf-8') as f:
+                json.dump(memory.as_dict(), f, indent=2)
+
+    if isinstance(profiler, SamplingProfiler):
+        if args.sample:
+            print("\n" + profiler.report(), file=sys.stderr)
+        if args.flamegraph:
+            with open(args.flamegraph, 'w', encoding='utf-8') as f:
+                f.write(profiler.as_collapsed())
+    elif profiler:
+        if args.profile:
+            print("\n" + profiler.report(), file=sys.stderr)
+        if args.profile_json:
+            with open(args.profile_json, 'w', encoding='utf-8') as f:
+                f.write(profiler.as_json())
+    return 1 if error else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a DAUPS program.")
+    parser.add_argument("source", help="DAUPS source file")
+    parser.add_argument("--no-optimize", action="store_true", help="run the AST exactly as parsed, without any optimization")
+    parser.add_argument("--no-loop-optimize", action="store_true", help="keep constant folding but skip loop-invariant hoisting and strength reduction")
+    parser.add_argument("--no-tail-calls", action="store_true", help="keep self-recursive 'return f(...)' as a nested call")
+    parser.add_argument("--no-stackless", action="store_true", help="nest user function calls on the Python stack")
+    parser.add_argument("--memoize", type=int, nargs="?", const=MemoCache.SIZE, default=None, metavar="N",
+                        help="cache up to N results of pure functions (default %(const)s); hit rate appears in the metrics")
+    parser.add_argument("--metrics", action="store_true", help="print run metrics (timings, counts, call depth) to stderr")
+    parser.add_argument("--metrics-json", metavar="PATH", help="write the run metrics as JSON")
+    parser.add_argument("--memory", action="store_true", help="print allocations per source line and value kind to stderr")
+    parser.add_argument("--memory-json", metavar="PATH", help="write the memory report as JSON")
+    parser.add_argument("--profile", action="store_true", help="print a per-line and per-node profile to stderr")
+    parser.add_argument("--profile-json", metavar="PATH", help="write the profile as JSON")
+    parser.add_argument("--sample", action="store_true", help="print a sampling profile to stderr")
+    parser.add_argument("--sample-interval", type=float, default=1.0, metavar="MS", help="sampling interval in milliseconds")
+    parser.add_argument("--flamegraph", metavar="PATH", help="write sampled stacks in collapsed format for flamegraph tools")
+    parser.add_argument("--max-steps", type=int, default=None, help="step limit")
+    parser.add_argument("--timeout", type=float, default=None, help="execution time limit in seconds")
+    parser.add_argument("--max-array-elements", type=int, default=None, help="budget of array elements created during the run (pop gives one back)")
+    parser.add_argument("--max-output-bytes", type=int, default=None, help="cap on printed bytes")
+    parser.add_argument("--max-call-depth", type=int, default=RunLimits.MAX_CALL_DEPTH, help="cap on nested function calls")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
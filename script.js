@@ -686,27 +686,29 @@ async function handleRun() {
     clearTerminal();
     hideInputLine();
     const code = DOM.editor.value;
+    let metricsSummary = null;
     try {
         inputQueue = [];
         inputWaiters = [];
         clearStopRequest();
         try { if (pyodide && pyodide.globals) pyodide.globals.set("__stop_requested", false); } catch (e) {}
         const pyCode = `
-result, error = await run_async('<web>', ${JSON.stringify(code)})
+result, error, metrics = await run_with_metrics('<web>', ${JSON.stringify(code)})
 if error:
     try:
             __js_write(error.as_string())
     except Exception:
             print(error.as_string())
+metrics.summary() if metrics else None
 `;
-        await pyodide.runPythonAsync(pyCode);
+        metricsSummary = await pyodide.runPythonAsync(pyCode);
     } catch (err) {
         appendOutput(`JS Error: ${err}\n`);
     } finally {
         runInProgress = false;
         DOM.runBtn.disabled = false;
         if (DOM.stopBtn) DOM.stopBtn.disabled = true;
-        setStatus("Ready");
+        setStatus(metricsSummary ? `Ready — ${metricsSummary}` : "Ready");
         try { if (pyodide && pyodide.globals) pyodide.globals.set("__stop_requested", false); } catch (e) {}
     }
 }
@@ -0,0 +1,156 @@
+import argparse
+import asyncio
+import json
+import time
+
+from basic import compile_program, InterpreterSession, RunLimits
+
+
+######################################
+# SERVER
+######################################
+
+# Line-delimited JSON over TCP.
+#   client -> server  {"type": "run", "source": "...", "inputs": ["1", "2"]}
+#                     {"type": "input", "value": "..."}   (answer to an input request)
+#   server -> client  {"type": "output", "data": "..."}
+#                     {"type": "input"}                  (the program is waiting on 'get')
+#                     {"type": "result", "error": null, "steps": 123, "elapsed": 0.01}
+#
+# Every run is bounded by the server's RunLimits. Every session yields back to the event loop after `slice_steps` statements,
+# and asyncio resumes ready tasks in FIFO order, so running programs are
+# interleaved round-robin. The timeout only counts a session's own slices,
+# not the time it spends waiting for the others, for input or for a slow
+# client to read its output. 'run' is disabled: it would read files on the server.
+
+class ExecutionServer:
+    DEFAULT_TIMEOUT = 10.0
+
+    def __init__(self, slice_steps=200, limits=None, max_sessions=None):
+        self.slice_steps = slice_steps
+        self.limits = limits or RunLimits(timeout=self.DEFAULT_TIMEOUT)
+        self.limiter = asyncio.Semaphore(max_sessions) if max_sessions else None
+        self.active_sessions = 0
+        self.completed_sessions = 0
+        self.open_connections = 0
+
+    async def handle_client(self, reader, writer):
+        self.open_connections += 1
+        try:
+            while True:
+                message = await self.read_message(reader)
+                if message is None:
+                    break
+                if message.get("type") != "run":
+                    await self.send(writer, {"type": "error", "error": "Expected a 'run' message"})
+                    continue
+                if self.limiter:
+                    async with self.limiter:
+                        await self.run_session(message, reader, writer)
+                else:
+                    await self.run_session(message, reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            self.open_connections -= 1
+
+    async def run_session(self, message, reader, writer):
+        start = time.perf_counter()
+        source = message.get("source", "")
+        inputs = list(message.get("inputs") or [])
+
+        def write(s):
+            writer.write((json.dumps({"type": "output", "data": str(s)}) + "\n").encode("utf-8"))
+
+        async def read_input():
+            if inputs:
+                return inputs.pop(0)
+            await self.send(writer, {"type": "input"})
+            reply = await self.read_message(reader)
+            if reply is None:
+                raise ConnectionError("Client disconnected while waiting for input")
+            return reply.get("value", "")
+
+        program, error = compile_program(message.get("fn", "<remote>"), source)
+        session = None
+        if not error:
+            session = InterpreterSession(
+                write=write,
+                read_input=read_input,
+                slice_steps=self.slice_steps,
+                limits=self.limits,
+                drain=writer.drain,
+                allow_run=False,
+            )
+            self.active_sessions += 1
+            try:
+                _, error = await session.run_program(program)
+            finally:
+                self.active_sessions -= 1
+                self.completed_sessions += 1
+
+        await self.send(writer, {
+            "type": "result",
+            "error": error.as_string() if error else None,
+            "steps": session.steps if session else 0,
+            "elapsed": time.perf_counter() - start,
+        })
+
+    async def read_message(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            return {}
+
+    async def send(self, writer, message):
+        writer.write((json.dumps(message) + "\n").encode("utf-8"))
+        await writer.drain()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        return await asyncio.start_server(self.handle_client, host, port, limit=2 ** 24)
+
+
+##### main #####
+
+def add_limit_arguments(parser):
+    parser.add_argument("--max-steps", type=int, default=None, help="per-run step limit")
+    parser.add_argument("--timeout", type=float, default=ExecutionServer.DEFAULT_TIMEOUT,
+                        help="per-run limit in seconds on the time spent running the program's own slices")
+    parser.add_argument("--max-array-elements", type=int, default=None, help="per-run budget of array elements created (pop gives one back)")
+    parser.add_argument("--max-output-bytes", type=int, default=None, help="per-run cap on printed bytes")
+    parser.add_argument("--max-call-depth", type=int, default=RunLimits.MAX_CALL_DEPTH, help="per-run cap on nested function calls")
+
+def limits_from_args(args):
+    return RunLimits(args.max_steps, args.timeout, args.max_array_elements, args.max_output_bytes, args.max_call_depth)
+
+async def serve(args):
+    server = ExecutionServer(args.slice_steps, limits_from_args(args), args.max_sessions)
+    tcp_server = await server.start(args.host, args.port)
+    addresses = ", ".join(str(sock.getsockname()) for sock in tcp_server.sockets)
+    print(f"DAUPS execution server listening on {addresses}")
+    async with tcp_server:
+        await tcp_server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve DAUPS program execution over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--slice-steps", type=int, default=200, help="statements a session runs before yielding to the others")
+    add_limit_arguments(parser)
+    parser.add_argument("--max-sessions", type=int, default=None, help="sessions allowed to run at once")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()